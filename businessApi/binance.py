@@ -1,110 +1,150 @@
 from businessUtils.apiUtils import (
-    compute_signature, 
-    timestamp)
+    ServerClock,
+    get_request_signer)
 from businessApi.client import Client
 
-from dotenv import load_dotenv
+import json
 import os
-import requests
-from typing import Dict, List, Union, Any
-
-
-load_dotenv()
+import threading
+from typing import Dict, List, Optional, Union, Any
 
 
 BASE_URL = "https://api3.binance.com"
+CACHE_TTLS: Dict[str, float] = {       # seconds public responses stay fresh, by endpoint path
+    "/api/v3/ticker/price": 60.0,
+    "/api/v3/exchangeInfo": 60 * 60.0
+}
 
-def _headers() -> Dict[str, str]:
-    '''
-    get request headers
-    '''
-    return {
-        "X-MBX-APIKEY": os.environ['API_KEY']
-    }
+_default_binance: Optional["Binance"] = None
+_default_binance_lock = threading.Lock()
 
 
-def _resolve_params(params: Dict[str, Any]={}) -> Dict[str, Any]:
+def get_default_binance() -> "Binance":
     '''
-    get request params resolved
-    ''' 
-    params["timestamp"] = timestamp()
-    params["signature"] = compute_signature(params, os.environ["SECRET_KEY"])
-
-    return params
+    get the client for the credentials in the environment shared by the module level functions
+    and portfolios, created on first use rather than on import
+    '''
+    global _default_binance
+    with _default_binance_lock:
+        if _default_binance is None:
+            _default_binance = Binance()
+    return _default_binance
 
 
 def get_all_orders(symbol: str) -> Union[List, Dict]:
     '''
     get all spot trading orders.
     '''
-    GET_ORDERS_ENDPOINT = f"{BASE_URL}/api/v3/allOrders"
-
-    headers = _headers()
-    params = _resolve_params({"symbol": symbol})
-
-    response = requests.get(GET_ORDERS_ENDPOINT, params=params, headers=headers)
-    return response.json()
+    return get_default_binance().get_all_orders(symbol)
 
 
 def get_spot_account_snapshot() -> Dict[str, Any]:
     '''
     get snapshot of spot account as a Dict.
     '''
-    GET_ACCOUNT_SNAPSHOT_ENDPOINT = f"{BASE_URL}/sapi/v1/accountSnapshot"
-
-    headers = _headers()
-    params = _resolve_params({"type": "SPOT"})
-
-    response = requests.get(GET_ACCOUNT_SNAPSHOT_ENDPOINT, params=params, headers=headers)
-    return response.json()
+    return get_default_binance().get_spot_account_snapshot()
 
 
 def get_ticker_price(ticker: str) -> Union[List, Dict]:
     '''
     get the latest price of a ticker.
     ''' 
-    GET_TICKER_PRICE_ENDPOINT = f"{BASE_URL}/api/v3/ticker/price"
-
-    headers = _headers()
-    params = {"symbol": ticker}
-
-    response = requests.get(GET_TICKER_PRICE_ENDPOINT, params=params, headers=headers)
-    return response.json()
+    return get_default_binance().get_ticker_price(ticker)
 
 
 class Binance(Client):
-    def __init__(self):
-        self.base_url: str = "https://api3.binance.com"
+    def __init__(self, api_key: Optional[str]=None, secret_key: Optional[str]=None, *args, **kwargs):
+        '''
+        `api_key` and `secret_key` default to the API_KEY and SECRET_KEY environment variables, read when a request is made.
+        '''
+        super().__init__(*args, **kwargs)
+        self.api_key: Optional[str] = api_key
+        self.secret_key: Optional[str] = secret_key
+        self.base_url: str = BASE_URL
+        self.stream_url: str = "wss://stream.binance.com:9443"
+        self.clock: ServerClock = ServerClock(self.get_server_time)
+        self.cache_ttls = dict(CACHE_TTLS)
 
     def _headers(self) -> Dict[str, str]:
         '''
         get request headers
         '''
         return {
-            "X-MBX-APIKEY": os.environ['API_KEY']
+            "X-MBX-APIKEY": self.api_key or os.environ['API_KEY']
         }
 
 
-    def _resolve_params(self, params: Dict[str, Any]={}) -> Dict[str, Any]:
+    def _resolve_params(self, params: Dict[str, Any]={}) -> str:
         '''
-        get request params resolved
+        get request params resolved, as the signed query string. It is sent as is, so the server
+        checks the signature against exactly the string that was signed.
         ''' 
-        params["timestamp"] = timestamp()
-        params["signature"] = compute_signature(params, os.environ["SECRET_KEY"])
+        params["timestamp"] = self.clock.timestamp()
+
+        return get_request_signer(self.secret_key or os.environ["SECRET_KEY"]).sign_params(params)
 
-        return params
 
+    def _resync_clock(self) -> bool:
+        return self.clock.try_sync()
 
-    def get_all_orders(self, symbol: str) -> Union[List, Dict]:
+
+    def get_server_time(self) -> int:
+        '''
+        get the server time in milliseconds.
+        '''
+        GET_SERVER_TIME_ENDPOINT = f"{self.base_url}/api/v3/time"
+
+        return self.send_get_request(GET_SERVER_TIME_ENDPOINT, weight=1)["serverTime"]
+
+
+    def get_all_orders(
+        self, 
+        symbol: str, 
+        order_id: Optional[int]=None, 
+        start_time: Optional[int]=None, 
+        limit: Optional[int]=None
+    ) -> Union[List, Dict]:
         '''
         get all spot trading orders.
+        `order_id` returns orders with an orderId >= it, `start_time` is in milliseconds and `limit` caps the page size (max 1000).
         '''
         GET_ORDERS_ENDPOINT = f"{self.base_url}/api/v3/allOrders"
 
         headers = self._headers()
-        params = self._resolve_params({"symbol": symbol})
+        query_params: Dict[str, Any] = {"symbol": symbol}
+        if order_id is not None:
+            query_params["orderId"] = order_id
+        if start_time is not None:
+            query_params["startTime"] = start_time
+        if limit is not None:
+            query_params["limit"] = limit
+
+        return self.send_get_request(GET_ORDERS_ENDPOINT, params=query_params, headers=headers, weight=20, signed=True)
+
+
+    def get_my_trades(
+        self,
+        symbol: str,
+        from_id: Optional[int]=None,
+        start_time: Optional[int]=None,
+        limit: Optional[int]=None
+    ) -> List[Dict[str, Any]]:
+        '''
+        get the trades (fills) of a symbol, with the commission paid on each.
+        `from_id` returns trades with an id >= it, `start_time` is in milliseconds and `limit` caps the page size (max 1000).
+        '''
+        GET_MY_TRADES_ENDPOINT = f"{self.base_url}/api/v3/myTrades"
 
-        return self.send_get_request(GET_ORDERS_ENDPOINT, params=params, headers=headers)
+        headers = self._headers()
+        query_params: Dict[str, Any] = {"symbol": symbol}
+        if from_id is not None:
+            query_params["fromId"] = from_id
+        if start_time is not None:
+            query_params["startTime"] = start_time
+        if limit is not None:
+            query_params["limit"] = limit
+
+        return self.send_get_request(GET_MY_TRADES_ENDPOINT, params=query_params, headers=headers, weight=20, signed=True)
 
 
     def get_spot_account_snapshot(self) -> Dict[str, Any]:
@@ -114,9 +154,10 @@ class Binance(Client):
         GET_ACCOUNT_SNAPSHOT_ENDPOINT = f"{self.base_url}/sapi/v1/accountSnapshot"
 
         headers = self._headers()
-        params = self._resolve_params({"type": "SPOT"})
+        params = {"type": "SPOT"}
 
-        return self.send_get_request(GET_ACCOUNT_SNAPSHOT_ENDPOINT, params=params, headers=headers)
+        # sapi endpoints are weighted against a separate limit
+        return self.send_get_request(GET_ACCOUNT_SNAPSHOT_ENDPOINT, params=params, headers=headers, weight=0, signed=True)
 
 
     def get_ticker_price(self, ticker: str) -> Union[List, Dict]:
@@ -128,4 +169,78 @@ class Binance(Client):
         headers = self._headers()
         params = {"symbol": ticker}
 
-        return self.send_get_request(GET_TICKER_PRICE_ENDPOINT, params=params, headers=headers)
+        return self.send_get_request(GET_TICKER_PRICE_ENDPOINT, params=params, headers=headers, weight=2)
+
+
+    def get_ticker_prices(self, symbols: Optional[List[str]]=None) -> List[Dict[str, str]]:
+        '''
+        get the latest prices of `symbols` in one request, or of every symbol when `symbols` is None.
+        '''
+        GET_TICKER_PRICE_ENDPOINT = f"{self.base_url}/api/v3/ticker/price"
+
+        headers = self._headers()
+        if symbols is None:
+            return self.send_get_request(GET_TICKER_PRICE_ENDPOINT, headers=headers, weight=4)
+
+        params = {"symbols": json.dumps(symbols, separators=(",", ":"))}
+        return self.send_get_request(GET_TICKER_PRICE_ENDPOINT, params=params, headers=headers, weight=4)
+
+
+    def get_exchange_info(self) -> Dict[str, Any]:
+        '''
+        get the trading rules and status of every symbol.
+        '''
+        GET_EXCHANGE_INFO_ENDPOINT = f"{self.base_url}/api/v3/exchangeInfo"
+
+        headers = self._headers()
+
+        return self.send_get_request(GET_EXCHANGE_INFO_ENDPOINT, headers=headers, weight=20)
+
+
+    def get_klines(
+        self,
+        symbol: str,
+        interval: str,
+        start_time: Optional[int]=None,
+        end_time: Optional[int]=None,
+        limit: Optional[int]=None
+    ) -> List[List[Any]]:
+        '''
+        get the candlesticks of a symbol, oldest first.
+        `start_time` and `end_time` bound the candle open times in milliseconds and `limit` caps the page size (max 1000).
+        '''
+        GET_KLINES_ENDPOINT = f"{self.base_url}/api/v3/klines"
+
+        headers = self._headers()
+        query_params: Dict[str, Any] = {"symbol": symbol, "interval": interval}
+        if start_time is not None:
+            query_params["startTime"] = start_time
+        if end_time is not None:
+            query_params["endTime"] = end_time
+        if limit is not None:
+            query_params["limit"] = limit
+
+        return self.send_get_request(GET_KLINES_ENDPOINT, params=query_params, headers=headers, weight=2)
+
+
+    def create_listen_key(self) -> str:
+        '''
+        start a user data stream and get its listen key.
+        '''
+        USER_DATA_STREAM_ENDPOINT = f"{self.base_url}/api/v3/userDataStream"
+
+        headers = self._headers()
+
+        return self.send_request("POST", USER_DATA_STREAM_ENDPOINT, headers=headers, weight=2)["listenKey"]
+
+
+    def keep_alive_listen_key(self, listen_key: str) -> None:
+        '''
+        extend the validity of a user data stream listen key by 60 minutes.
+        '''
+        USER_DATA_STREAM_ENDPOINT = f"{self.base_url}/api/v3/userDataStream"
+
+        headers = self._headers()
+        params = {"listenKey": listen_key}
+
+        self.send_request("PUT", USER_DATA_STREAM_ENDPOINT, params=params, headers=headers, weight=2)
@@ -1,19 +1,328 @@
-from businessUtils.logUtils import LogLevel, log
-from businessUtils.apiUtils import http_request
+from businessUtils.logUtils import LogLevel, is_log_enabled, log
+from businessUtils.apiUtils import decode_json, encode_json, format_query_params, http_request, is_timestamp_error
+from businessUtils.fileIOUtils import open_response_cache_store, read_cached_response, write_cached_response
+from businessUtils.metricsUtils import metrics
+from businessUtils.switchUtils import Switch
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
+from urllib.parse import urlparse
 import requests
-from typing import Any
+import threading
+import time
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1m"
+DEFAULT_WEIGHT_LIMIT = 6000         # binance REQUEST_WEIGHT limit per minute for /api endpoints
+DEFAULT_WEIGHT_HEADROOM = 0.9       # fraction of the limit we allow ourselves to use
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_POOL_SIZE = DEFAULT_MAX_WORKERS
+DEFAULT_TIMEOUT = (3.05, 30)        # connect and read timeouts in seconds
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5        # seconds, doubled on every retry
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_MAX_RETRY_AFTER = 120.0     # give up instead of sleeping through longer bans (418)
+RETRY_STATUS_CODES = {418, 429, 500, 502, 503, 504}
+DEFAULT_MAX_CACHED_RESPONSES = 256
+DEFAULT_MAX_STORED_RESPONSES = 1024
+RESPONSE_CACHE_FILENAME = "response_cache"
+
+
+_UNDECODED = object()
+
+
+def _decode_response(response: Response) -> Any:
+    '''
+    decode a json response body, falling back to its text for bodies that are not json
+    '''
+    try:
+        with metrics.timer("http.decode"):
+            return decode_json(response.content)
+    except ValueError:
+        return response.text
+
+
+class RequestWeightLimiter(object):
+    '''
+    Tracks the request weight used in the current minute, from our own requests and the
+    `X-MBX-USED-WEIGHT-1m` response header, and blocks requests that would go over the limit.
+    '''
+    def __init__(self, weight_limit: int=DEFAULT_WEIGHT_LIMIT, headroom: float=DEFAULT_WEIGHT_HEADROOM):
+        self.weight_limit: int = int(weight_limit * headroom)
+        self.used_weight: int = 0
+        self.window: int = self._current_window()
+        self._lock = threading.Lock()
+
+
+    @staticmethod
+    def _current_window() -> int:
+        '''
+        binance resets request weight every clock minute
+        '''
+        return int(time.time() // 60)
+
+
+    def _roll_window(self) -> None:
+        '''
+        reset the used weight once a new minute window starts. Caller must hold the lock.
+        '''
+        window = self._current_window()
+        if window != self.window:
+            self.window = window
+            self.used_weight = 0
+
+
+    def acquire(self, weight: int) -> None:
+        '''
+        reserve `weight` in the current window, sleeping until the next window when it does not fit
+        '''
+        while True:
+            with self._lock:
+                self._roll_window()
+                if self.used_weight + weight <= self.weight_limit or self.used_weight == 0:
+                    self.used_weight += weight
+                    return
+                wait_seconds = 60 - time.time() % 60
+
+            log(LogLevel.INFO, f"Request weight limit reached (used={self.used_weight}). Waiting {wait_seconds:.2f}s.")
+            time.sleep(wait_seconds)
+
+
+    def update(self, used_weight: int) -> None:
+        '''
+        sync with the used weight reported by binance, which also counts requests made outside this process
+        '''
+        with self._lock:
+            self._roll_window()
+            self.used_weight = max(self.used_weight, used_weight)
+
+
+class ResponseCache(object):
+    '''
+    Caches response bodies until they expire, in an in-memory LRU of `max_entries` responses backed, when
+    `store_filename` is given, by a SQLite store that outlives the run. Bodies are kept encoded, so every
+    hit decodes a fresh copy that callers are free to change. Hits and misses are counted.
+    '''
+    def __init__(
+        self,
+        max_entries: int=DEFAULT_MAX_CACHED_RESPONSES,
+        store_filename: Optional[str]=None,
+        max_store_entries: int=DEFAULT_MAX_STORED_RESPONSES
+    ):
+        self.max_entries: int = max_entries
+        self.max_store_entries: int = max_store_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._store = open_response_cache_store(store_filename) if store_filename else None
+        self._lock = threading.Lock()
+
+
+    def get(self, key: str) -> Optional[Any]:
+        '''
+        get the response cached under `key`, or None when it is missing or expired
+        '''
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None and self._store is not None:
+                entry = read_cached_response(self._store, key, now)
+                if entry is not None:
+                    self._remember(key, entry)
+            elif entry is not None:
+                self._entries.move_to_end(key)
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.increment("cache.misses" if entry is None else "cache.hits")
+
+        return None if entry is None else decode_json(entry[1])
+
+
+    def set(self, key: str, payload: Any, ttl: float) -> None:
+        '''
+        cache `payload` under `key` for `ttl` seconds
+        '''
+        now = time.time()
+        entry = (now + ttl, encode_json(payload))
+        with self._lock:
+            self._remember(key, entry)
+            if self._store is not None:
+                write_cached_response(self._store, key, *entry, now, self.max_store_entries)
+
+
+    def _remember(self, key: str, entry: Tuple[float, bytes]) -> None:
+        '''
+        keep `entry` in memory as the most recently used, evicting the least recently used beyond `max_entries`. Caller must hold the lock.
+        '''
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.increment("cache.evictions")
 
 
 class Client(object):
-    def __init__(self):
-        pass
-    
-    @http_request
+    def __init__(
+        self,
+        max_workers: int=DEFAULT_MAX_WORKERS,
+        weight_limiter: Optional[RequestWeightLimiter]=None,
+        pool_size: int=DEFAULT_POOL_SIZE,
+        timeout: Tuple[float, float]=DEFAULT_TIMEOUT,
+        max_retries: int=DEFAULT_MAX_RETRIES,
+        backoff_factor: float=DEFAULT_BACKOFF_FACTOR,
+        response_cache: Optional[ResponseCache]=None
+    ):
+        self.max_workers: int = max_workers
+        self.weight_limiter: RequestWeightLimiter = weight_limiter or RequestWeightLimiter()
+        self.timeout: Tuple[float, float] = timeout
+        self.max_retries: int = max_retries
+        self.backoff_factor: float = backoff_factor
+        self.response_cache: ResponseCache = response_cache or ResponseCache(
+            store_filename=RESPONSE_CACHE_FILENAME if Switch.check_switch("persist_response_cache") else None
+        )
+        # seconds the responses of unsigned GETs to an endpoint path stay fresh. Endpoints not listed are never cached
+        self.cache_ttls: Dict[str, float] = {}
+
+        # one keep-alive connection pool per host, shared by all worker threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+
+    def _resolve_params(self, params: Dict[str, Any]) -> Union[Dict[str, Any], str]:
+        '''
+        get request params resolved for a signed request. Overridden by clients of authenticated APIs.
+        '''
+        return params
+
+
+    def _resync_clock(self) -> bool:
+        '''
+        resync the timestamps of signed requests with the server after one was rejected for its timestamp.
+        Returns whether the request is worth retrying. Overridden by clients that keep a server clock.
+        '''
+        return False
+
+
+    def _retry_delay(self, attempt: int, response: Optional[Response]=None) -> float:
+        '''
+        seconds to wait before retry number `attempt + 1`, honouring the `Retry-After` header when present
+        '''
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return float(response.headers["Retry-After"])
+        return min(self.backoff_factor * 2 ** attempt, DEFAULT_MAX_BACKOFF)
+
+
     def send_get_request(self, url_endpoint: str, *args, **kwargs) -> Any:
-        ''' send HTTP get request to `urlendpoint`'''
-        log(LogLevel.INFO, f"Sending GET request to: {url_endpoint}. With arguments: args={args} kwargs={kwargs}.")
-        response = requests.get(url_endpoint, *args, **kwargs)
-        log(LogLevel.INFO, f"Received response from {url_endpoint} with status={response.status_code}: {response.json()}")
-        return response
+        '''
+        send HTTP get request to `urlendpoint`. Unsigned requests to endpoints with a ttl in `self.cache_ttls`
+        are answered from the response cache while fresh.
+        '''
+        cache_ttl = self.cache_ttls.get(urlparse(url_endpoint).path)
+        if cache_ttl is None or kwargs.get("signed"):
+            return self.send_request("GET", url_endpoint, *args, **kwargs)
+
+        cache_key = f"{url_endpoint}?{format_query_params(dict(sorted((kwargs.get('params') or {}).items())))}"
+        payload = self.response_cache.get(cache_key)
+        if payload is None:
+            payload = self.send_request("GET", url_endpoint, *args, **kwargs)
+            self.response_cache.set(cache_key, payload, cache_ttl)
+
+        return payload
+
+
+    @http_request
+    def send_request(
+        self,
+        method: str,
+        url_endpoint: str,
+        *args,
+        params: Optional[Dict[str, Any]]=None,
+        weight: int=1,
+        signed: bool=False,
+        **kwargs
+    ) -> Tuple[Response, Any]:
+        '''
+        send HTTP `method` request to `urlendpoint`, costing `weight` of the per minute request weight.
+        Signed requests get fresh `params` signatures on every attempt, and are retried once right away
+        after resyncing the clock when rejected for their timestamp.
+        The body is decoded once here and returned alongside the response.
+        '''
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint_path = urlparse(url_endpoint).path
+        clock_resynced = False
+
+        for attempt in range(self.max_retries + 1):
+            self.weight_limiter.acquire(weight)
+            with metrics.timer("http.sign"):
+                request_params = self._resolve_params(dict(params or {})) if signed else params
+            log(LogLevel.INFO, f"Sending {method} request to: {url_endpoint}. With arguments: args={args} params={request_params} kwargs={kwargs}.")
+            metrics.increment("http.requests")
+            if attempt > 0:
+                metrics.increment("http.retries")
+            try:
+                with metrics.timer(f"http.{method.lower()} {endpoint_path}"):
+                    response = self.session.request(method, url_endpoint, *args, params=request_params, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.increment("http.connection_errors")
+                if attempt == self.max_retries:
+                    raise e
+                delay = self._retry_delay(attempt)
+                log(LogLevel.ERROR, f"{method} request to {url_endpoint} failed: {e}. Retrying in {delay:.2f}s.")
+                time.sleep(delay)
+                continue
+
+            used_weight = response.headers.get(USED_WEIGHT_HEADER)
+            if used_weight is not None:
+                self.weight_limiter.update(int(used_weight))
+                metrics.set_gauge("http.used_weight", int(used_weight))
+            metrics.increment("http.bytes", len(response.content))
+            metrics.increment(f"http.status.{response.status_code}")
+
+            payload = _UNDECODED
+            if signed and not clock_resynced and attempt < self.max_retries and response.status_code == 400:
+                # decoded once, for the timestamp check and the error raised when it is not retried
+                payload = _decode_response(response)
+                if is_timestamp_error(payload) and self._resync_clock():
+                    log(LogLevel.ERROR, f"{method} request to {url_endpoint} was rejected for its timestamp. Retrying with the clock resynced.")
+                    metrics.increment("http.clock_resyncs")
+                    clock_resynced = True
+                    continue
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                break
+            delay = self._retry_delay(attempt, response)
+            if delay > DEFAULT_MAX_RETRY_AFTER:
+                break
+            log(LogLevel.ERROR, f"{method} request to {url_endpoint} returned status={response.status_code}. Retrying in {delay:.2f}s.")
+            time.sleep(delay)
+
+        log(LogLevel.INFO, f"Received response from {url_endpoint} with status={response.status_code} ({len(response.content)} bytes).")
+        if payload is _UNDECODED:
+            payload = _decode_response(response)
+        if is_log_enabled(LogLevel.TRACE):
+            log(LogLevel.TRACE, f"Response body from {url_endpoint}: {payload}")
+        return response, payload
+
+
+    def map_concurrently(self, request_function: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        '''
+        call `request_function` on each of `items` from a pool of `self.max_workers` threads.
+        Results are returned in the order of `items` and the first exception raised is re-raised.
+        '''
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(request_function, items))
 
@@ -0,0 +1,53 @@
+from businessUtils.apiUtils import decode_json
+from businessUtils.logUtils import LogLevel, log
+from businessUtils.metricsUtils import metrics
+
+from typing import Any, Callable, Dict, List
+import asyncio
+import websockets
+
+
+DEFAULT_RECONNECT_DELAY = 1.0       # seconds, doubled after every failed connection
+DEFAULT_MAX_RECONNECT_DELAY = 60.0
+
+
+class BinanceStream(object):
+    '''
+    Reads a binance combined websocket stream and hands every event to `on_message` with its stream name.
+    The connection is reopened with backoff whenever it drops, e.g. at binance's 24 hour disconnect,
+    or cannot be opened, e.g. when the handshake is rejected or times out.
+    '''
+    def __init__(
+        self,
+        stream_url: str,
+        streams: List[str],
+        on_message: Callable[[str, Dict[str, Any]], None],
+        reconnect_delay: float=DEFAULT_RECONNECT_DELAY
+    ):
+        self.url: str = f"{stream_url}/stream?streams={'/'.join(streams)}"
+        self.on_message: Callable[[str, Dict[str, Any]], None] = on_message
+        self.reconnect_delay: float = reconnect_delay
+
+
+    async def run(self) -> None:
+        '''
+        read the stream until cancelled
+        '''
+        reconnect_delay = self.reconnect_delay
+        while True:
+            try:
+                log(LogLevel.INFO, f"Connecting to stream: {self.url}.")
+                async with websockets.connect(self.url) as connection:
+                    reconnect_delay = self.reconnect_delay
+                    async for message in connection:
+                        metrics.increment("stream.messages")
+                        payload = decode_json(message)
+                        try:
+                            self.on_message(payload["stream"], payload["data"])
+                        except Exception as e:
+                            log(LogLevel.ERROR, f"Failed to handle stream message: {payload}. {e}")
+            except (websockets.ConnectionClosed, websockets.InvalidHandshake, asyncio.TimeoutError, OSError) as e:
+                metrics.increment("stream.reconnects")
+                log(LogLevel.ERROR, f"Stream connection lost: {e}. Reconnecting in {reconnect_delay:.2f}s.")
+                await asyncio.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, DEFAULT_MAX_RECONNECT_DELAY)
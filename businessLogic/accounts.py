@@ -0,0 +1,118 @@
+from businessApi.binance import Binance
+from businessApi.client import Client, RequestWeightLimiter
+from businessLogic.portfolio import Portfolio
+from businessUtils.errorUtils import RuntimeException
+from businessUtils.fileIOUtils import write_to_excel, write_to_json
+from businessUtils.logUtils import LogLevel, log
+from businessUtils.metricsUtils import metrics
+from businessUtils.portfolioUtils import consolidate_portfolio_summaries
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import os
+
+
+DEFAULT_ACCOUNT_WORKERS = 4
+DEFAULT_ACCOUNTS_DIR = "accounts"
+
+
+class Account(object):
+    '''
+    A binance account, or sub-account, the credentials of its API key and the cost offset of its portfolio.
+    '''
+    def __init__(self, name: str, api_key: str, secret_key: str, portfolio_cost_offset: float=0.0):
+        self.name: str = name
+        self.api_key: str = api_key
+        self.secret_key: str = secret_key
+        self.portfolio_cost_offset: float = portfolio_cost_offset
+
+
+def load_accounts() -> List[Account]:
+    '''
+    load the accounts named in the comma separated ACCOUNTS environment variable.
+    The credentials of an account `name` are read from `{NAME}_API_KEY` and `{NAME}_SECRET_KEY`,
+    and its portfolio cost offset from the optional `{NAME}_PORTFOLIO_COST_OFFSET` (0 by default).
+    '''
+    accounts: List[Account] = []
+    for name in filter(None, (name.strip() for name in os.environ.get("ACCOUNTS", "").split(","))):
+        try:
+            accounts.append(Account(
+                name,
+                os.environ[f"{name.upper()}_API_KEY"],
+                os.environ[f"{name.upper()}_SECRET_KEY"],
+                float(os.environ.get(f"{name.upper()}_PORTFOLIO_COST_OFFSET", 0.0))
+            ))
+        except KeyError as e:
+            raise RuntimeException(f"Missing credentials for account: '{name}'. {e} is not set.")
+
+    return accounts
+
+
+def create_binance_client(account: Account, weight_limiter: RequestWeightLimiter) -> Client:
+    return Binance(account.api_key, account.secret_key, weight_limiter=weight_limiter)
+
+
+class AccountRunner(object):
+    '''
+    Updates the portfolios of several accounts concurrently, each in its own `{output_dir}/{account name}`,
+    then writes a summary consolidated across accounts to `output_dir`.
+    Request weight is limited per IP by binance, so every account shares one `weight_limiter`.
+    '''
+    def __init__(
+        self,
+        accounts: List[Account],
+        output_dir: str=DEFAULT_ACCOUNTS_DIR,
+        max_workers: int=DEFAULT_ACCOUNT_WORKERS,
+        weight_limiter: Optional[RequestWeightLimiter]=None,
+        client_factory: Callable[[Account, RequestWeightLimiter], Client]=create_binance_client
+    ):
+        if len({account.name for account in accounts}) != len(accounts):
+            raise RuntimeException("Account names must be unique, they name the output directory of each account.")
+
+        self.accounts: List[Account] = accounts
+        self.output_dir: str = output_dir
+        self.max_workers: int = max_workers
+        self.weight_limiter: RequestWeightLimiter = weight_limiter or RequestWeightLimiter()
+        self.client_factory: Callable[[Account, RequestWeightLimiter], Client] = client_factory
+
+
+    def run(self) -> Dict[str, List[Dict[str, Any]]]:
+        '''
+        update every account and write the consolidated summary.
+        A failing account is logged and left out of the consolidated summary, without stopping the others.
+        Returns the portfolio summary of every account that was updated, by account name.
+        '''
+        log(LogLevel.INFO, f"Updating {len(self.accounts)} accounts with {self.max_workers} workers.")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {account.name: executor.submit(self._update_account, account) for account in self.accounts}
+
+        account_summaries: Dict[str, List[Dict[str, Any]]] = {}
+        for name, future in futures.items():
+            try:
+                account_summaries[name] = future.result()
+            except Exception as e:
+                metrics.increment("accounts.failed")
+                log(LogLevel.ERROR, f"Failed to update account: '{name}'. {e}")
+
+        if account_summaries:
+            consolidated_summary = consolidate_portfolio_summaries(account_summaries)
+            filename = os.path.join(self.output_dir, "consolidated_portfolio_summary")
+            write_to_json(consolidated_summary, filename)
+            write_to_excel(consolidated_summary, filename)
+        log(LogLevel.INFO, f"Done updating {len(account_summaries)} of {len(self.accounts)} accounts.")
+
+        return account_summaries
+
+
+    def _update_account(self, account: Account) -> List[Dict[str, Any]]:
+        log(LogLevel.INFO, f"Updating account: '{account.name}'.")
+        portfolio = Portfolio(
+            binance=self.client_factory(account, self.weight_limiter),
+            output_dir=os.path.join(self.output_dir, account.name),
+            portfolio_cost_offset=account.portfolio_cost_offset
+        )
+        with metrics.timer(f"accounts.update {account.name}"):
+            portfolio.update()
+        metrics.increment("accounts.updated")
+
+        return portfolio.create_portfolio_summary()
@@ -0,0 +1,195 @@
+from businessApi.stream import BinanceStream
+from businessLogic.portfolio import Portfolio
+from businessUtils.errorUtils import RuntimeException
+from businessUtils.fileIOUtils import write_to_json
+from businessUtils.logUtils import LogLevel, log
+from businessUtils.metricsUtils import metrics
+from businessUtils.portfolioUtils import map_execution_report_to_order, resolve_spot_balance
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+import asyncio
+
+
+DEFAULT_WRITE_INTERVAL = 1.0            # seconds between summary writes while prices move
+LISTEN_KEY_KEEP_ALIVE_INTERVAL = 30 * 60
+PRICE_STREAMS = ("miniTicker", "bookTicker")
+
+
+class PortfolioDaemon(object):
+    '''
+    Keeps a `Portfolio` in memory and live: prices come from the miniTicker (or bookTicker) streams
+    of every coin and executions and balances from the user data stream, so PnL stays fresh
+    without any REST polling. Summaries are written at most once every `write_interval` seconds.
+    Order store updates and file writes run in order on a worker thread, off the event loop.
+    '''
+    def __init__(
+        self,
+        portfolio: Portfolio,
+        stream_url: Optional[str]=None,
+        price_stream: str="miniTicker",
+        write_interval: float=DEFAULT_WRITE_INTERVAL,
+        use_user_data_stream: bool=True,
+        refresh_on_start: bool=True
+    ):
+        if price_stream not in PRICE_STREAMS:
+            raise RuntimeException(f"Unknown price stream: '{price_stream}'. Expected one of: {PRICE_STREAMS}.")
+
+        self.portfolio: Portfolio = portfolio
+        self.stream_url: str = stream_url or portfolio.binance.stream_url
+        self.price_stream: str = price_stream
+        self.write_interval: float = write_interval
+        self.use_user_data_stream: bool = use_user_data_stream
+        self.refresh_on_start: bool = refresh_on_start
+
+        self.listen_key: Optional[str] = None
+        self.symbol_coins: Dict[str, str] = {}
+        self.is_dirty: bool = False
+        self._worker: Optional[ThreadPoolExecutor] = None
+        self._pending_orders: Set["asyncio.Future[None]"] = set()
+
+
+    async def run(self, stop_event: Optional[asyncio.Event]=None) -> None:
+        '''
+        run until `stop_event` is set (or forever), writing a last summary on the way out.
+        Raises the error of any daemon task that dies meanwhile, e.g. the stream, rather than running on with stale prices.
+        '''
+        stop_event = stop_event or asyncio.Event()
+        if self.use_user_data_stream:
+            self.portfolio.check_can_apply_new_orders()
+        if self.refresh_on_start:
+            self.portfolio.update()
+        # a single worker applies execution reports and writes summaries in the order they arrive
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="daemon")
+
+        # price streams follow the pairs the portfolio was priced with. Coins priced through a conversion
+        # pair keep the price of the last full update
+        self.symbol_coins = {
+            ticker_price["symbol"]: coin for coin, ticker_price in self.portfolio.ticker_prices.items()
+            if "quoteSymbol" not in ticker_price
+        }
+        streams: List[str] = [f"{symbol.lower()}@{self.price_stream}" for symbol in self.symbol_coins]
+        tasks = [asyncio.ensure_future(self._write_periodically())]
+        if self.use_user_data_stream:
+            self.listen_key = self.portfolio.binance.create_listen_key()
+            streams.append(self.listen_key)
+            tasks.append(asyncio.ensure_future(self._keep_alive_listen_key()))
+        tasks.append(asyncio.ensure_future(BinanceStream(self.stream_url, streams, self.handle_message).run()))
+
+        log(LogLevel.INFO, f"Portfolio daemon started with {len(streams)} streams.")
+        stop_task = asyncio.ensure_future(stop_event.wait())
+        try:
+            done, _ = await asyncio.wait([stop_task, *tasks], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # the daemon tasks run until cancelled, so one that is done has failed
+                if task is not stop_task:
+                    log(LogLevel.ERROR, f"Portfolio daemon task failed: {task.exception()!r}. Stopping the daemon.")
+                    raise task.exception() or RuntimeException("Portfolio daemon task stopped unexpectedly.")
+        finally:
+            for task in (stop_task, *tasks):
+                task.cancel()
+            await asyncio.gather(stop_task, *tasks, *self._pending_orders, return_exceptions=True)
+            await self.write()
+            self._worker.shutdown()
+            log(LogLevel.INFO, "Portfolio daemon stopped.")
+
+
+    def handle_message(self, stream: str, event: Dict[str, Any]) -> None:
+        '''
+        apply one stream event to the in-memory portfolio
+        '''
+        event_type = event.get("e")
+        if event_type == "24hrMiniTicker":
+            self._update_price(event["s"], float(event["c"]))
+        elif event_type is None and stream.endswith("@bookTicker"):
+            self._update_price(event["s"], (float(event["b"]) + float(event["a"])) / 2)
+        elif event_type == "executionReport":
+            self._apply_execution_report(event)
+        elif event_type == "outboundAccountPosition":
+            self._update_balances(event["B"])
+
+
+    def _update_price(self, symbol: str, price: float) -> None:
+        coin = self.symbol_coins.get(symbol)
+        if coin is None:
+            return
+
+        self.portfolio.ticker_prices[coin]["price"] = str(price)
+        if coin in self.portfolio.spot_balance:
+            balance = self.portfolio.spot_balance[coin]
+            self._reprice_balance(coin, balance["balanceQty"], balance["locked"])
+        metrics.increment("daemon.price_updates")
+
+
+    def _reprice_balance(self, asset: str, free: str, locked: str) -> None:
+        '''
+        re-resolve the spot balance of one asset, the same way the REST snapshot is resolved
+        '''
+        if asset != self.portfolio.base_currency and asset not in self.portfolio.ticker_prices:
+            log(LogLevel.ERROR, f"No live price for asset: {asset}. Its balance is valued on the next full update.")
+            return
+
+        self.portfolio.spot_balance[asset] = resolve_spot_balance(
+            [{"asset": asset, "free": free, "locked": locked}],
+            self.portfolio.ticker_prices
+        )[0]
+        self.is_dirty = True
+
+
+    def _update_balances(self, balances: List[Dict[str, str]]) -> None:
+        for balance in balances:
+            self._reprice_balance(balance["a"], balance["f"], balance["l"])
+
+
+    def _apply_execution_report(self, execution_report: Dict[str, Any]) -> None:
+        '''
+        queue the order of an execution report on the worker, marking the portfolio dirty once it is applied
+        '''
+        log(LogLevel.INFO, f"Execution report for order {execution_report['i']} ({execution_report['s']}): {execution_report['X']}.")
+        applied_order = self._run_on_worker(self.portfolio.apply_new_orders, [map_execution_report_to_order(execution_report)])
+        self._pending_orders.add(applied_order)
+        applied_order.add_done_callback(self._on_order_applied)
+
+
+    def _on_order_applied(self, applied_order: "asyncio.Future[None]") -> None:
+        self._pending_orders.discard(applied_order)
+        if applied_order.cancelled():
+            return
+        if applied_order.exception() is not None:
+            log(LogLevel.ERROR, f"Failed to apply execution report. {applied_order.exception()}")
+            return
+        self.is_dirty = True
+
+
+    def _run_on_worker(self, function: Callable[..., None], *args: Any) -> "asyncio.Future[None]":
+        return asyncio.get_event_loop().run_in_executor(self._worker, function, *args)
+
+
+    async def write(self) -> None:
+        '''
+        write the live spot balance and portfolio summary. The rows are created on the event loop,
+        then written to disk on the worker.
+        '''
+        spot_balance = list(self.portfolio.spot_balance.values())
+        portfolio_summary = self.portfolio.create_portfolio_summary()
+        self.is_dirty = False
+        await self._run_on_worker(self._write_files, spot_balance, portfolio_summary)
+
+
+    def _write_files(self, spot_balance: List[Dict[str, Any]], portfolio_summary: List[Dict[str, Any]]) -> None:
+        with metrics.timer("daemon.write"):
+            write_to_json(spot_balance, self.portfolio.spot_balance_filename)
+            write_to_json(portfolio_summary, self.portfolio.portfolio_summary_filename)
+
+
+    async def _write_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.write_interval)
+            if self.is_dirty:
+                await self.write()
+
+
+    async def _keep_alive_listen_key(self) -> None:
+        while True:
+            await asyncio.sleep(LISTEN_KEY_KEEP_ALIVE_INTERVAL)
+            self.portfolio.binance.keep_alive_listen_key(self.listen_key)
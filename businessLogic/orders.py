@@ -0,0 +1,125 @@
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional
+import sys
+
+
+ORDER_FIELDS = (
+    "symbol",
+    "orderId",
+    "orderListId",
+    "clientOrderId",
+    "price",
+    "origQty",
+    "executedQty",
+    "cummulativeQuoteQty",
+    "status",
+    "timeInForce",
+    "type",
+    "side",
+    "stopPrice",
+    "icebergQty",
+    "time",
+    "updateTime",
+    "isWorking",
+    "workingTime",
+    "origQuoteOrderQty",
+    "selfTradePreventionMode"
+)
+RESOLVED_TRADE_FIELDS = ("actualQty", "fee", "actualCost", "totalCost")     # set by `resolve_spot_trade`
+DECIMAL_FIELDS = frozenset(("price", "origQty", "executedQty", "cummulativeQuoteQty", "stopPrice", "icebergQty", "origQuoteOrderQty"))
+ENUM_FIELDS = frozenset(("symbol", "status", "timeInForce", "type", "side", "selfTradePreventionMode"))
+DECIMAL_FORMAT = "{:.8f}"       # binance formats every decimal with 8 decimal places
+_FIELDS = frozenset(ORDER_FIELDS + RESOLVED_TRADE_FIELDS)
+
+
+def _parse_field(field: str, value: Any) -> Any:
+    '''
+    parse a decimal string to a float when formatting the float gives the string back, and intern enum-like strings
+    '''
+    if field in DECIMAL_FIELDS and isinstance(value, str):
+        decimal = float(value)
+        return decimal if DECIMAL_FORMAT.format(decimal) == value else value
+    if field in ENUM_FIELDS and isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+class SpotOrder(MutableMapping):
+    '''
+    A spot order held in `__slots__` rather than a dict. Decimals are parsed to floats once and
+    repeated strings like status and side are shared between orders. It reads and writes like the
+    order dict it is created from, so the functions of `portfolioUtils` take either.
+    `to_dict` gives that dict back unchanged, with unknown fields kept as they are.
+    '''
+    __slots__ = ORDER_FIELDS + RESOLVED_TRADE_FIELDS + ("_extra_fields",)
+
+    def __init__(self, **fields: Any):
+        self._extra_fields: Optional[Dict[str, Any]] = None
+        for field, value in fields.items():
+            self[field] = value
+
+
+    @classmethod
+    def from_dict(cls, order: Dict[str, Any]) -> "SpotOrder":
+        return cls(**order)
+
+
+    def to_dict(self) -> Dict[str, Any]:
+        '''
+        get the order as a dict, with its decimals formatted like binance does
+        '''
+        return {
+            field: DECIMAL_FORMAT.format(value) if field in DECIMAL_FIELDS and isinstance(value, float) else value
+            for field, value in self.items()
+        }
+
+
+    def __getitem__(self, field: str) -> Any:
+        if field in _FIELDS:
+            try:
+                return getattr(self, field)
+            except AttributeError:
+                raise KeyError(field)
+        if self._extra_fields is None:
+            raise KeyError(field)
+        return self._extra_fields[field]
+
+
+    def __setitem__(self, field: str, value: Any) -> None:
+        if field in _FIELDS:
+            setattr(self, field, _parse_field(field, value))
+        else:
+            if self._extra_fields is None:
+                self._extra_fields = {}
+            self._extra_fields[field] = value
+
+
+    def __delitem__(self, field: str) -> None:
+        if field in _FIELDS:
+            try:
+                delattr(self, field)
+            except AttributeError:
+                raise KeyError(field)
+        elif self._extra_fields is None:
+            raise KeyError(field)
+        else:
+            del self._extra_fields[field]
+
+
+    def __iter__(self) -> Iterator[str]:
+        for field in ORDER_FIELDS:
+            if hasattr(self, field):
+                yield field
+        if self._extra_fields is not None:
+            yield from self._extra_fields
+        for field in RESOLVED_TRADE_FIELDS:
+            if hasattr(self, field):
+                yield field
+
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+    def __repr__(self) -> str:
+        return f"SpotOrder({self.to_dict()})"
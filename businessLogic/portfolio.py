@@ -1,33 +1,76 @@
-from businessApi.binance import (
-    Binance,
-    get_all_orders, 
-    get_spot_account_snapshot,
-    get_ticker_price
-)
+from businessApi.binance import get_default_binance
 from businessApi.client import Client
-from businessUtils.errorUtils import ClientException
+from businessLogic.orders import SpotOrder
+from businessUtils.apiUtils import is_invalid_symbol_error, timestamp
+from businessUtils.errorUtils import ClientException, RuntimeException
 from businessUtils.portfolioUtils import (
     format_trade_history, 
+    parse_trade_history,
     create_ticker_summary,
+    create_ticker_summary_from_aggregate,
+    fold_ticker_aggregates,
+    fold_ticker_aggregate_frame,
+    resolve_spot_trade_frame,
     resolve_portfolio_summary_old, 
     resolve_spot_trade,
     reduce_trade_history,
     resolve_spot_balance,
-    resolve_portfolio_summary
+    find_balances_to_reprice,
+    resolve_portfolio_summary,
+    resolve_ticker_price,
+    create_symbol_index,
+    find_symbol,
+    update_order_cursor,
+    find_missing_kline_ranges,
+    create_pnl_history,
+    resolve_pnl_history,
+    create_fill_summaries,
+    KLINE_INTERVALS
 )
 from businessUtils.fileIOUtils import (
+    export_queue,
+    queue_export,
     write_to_excel,
     write_to_json,
-    read_from_json
+    read_from_json,
+    open_order_store,
+    upsert_orders,
+    count_orders,
+    read_orders,
+    read_unaggregated_orders,
+    read_unaggregated_order_frame,
+    read_ticker_aggregates,
+    write_ticker_aggregates,
+    open_kline_cache,
+    upsert_klines,
+    read_cached_kline_range,
+    read_kline_closes,
+    insert_fills,
+    read_fills,
+    read_orders_between,
+    partition_date,
+    partition_time_range,
+    queue_parquet_export,
+    read_parquet,
+    ORDER_PARQUET_COLUMNS,
+    SUMMARY_PARQUET_COLUMNS
 )
 from businessUtils.switchUtils import Switch
 from businessUtils.logUtils import LogLevel, log
+from businessUtils.metricsUtils import metrics, timed
 
-from typing import List, Dict, Any, Set, Union
+from typing import List, Dict, Any, Optional, Set, Tuple, Union
 from collections import defaultdict
+import os
+import sqlite3
+import threading
 import time
 
-binance = Binance()
+ORDER_HISTORY_PAGE_LIMIT = 1000
+KLINE_PAGE_LIMIT = 1000
+FILL_PAGE_LIMIT = 1000
+SYMBOL_INDEX_TTL = 24 * 60 * 60 * 1000     # milliseconds
+_symbol_index_lock = threading.Lock()
 
 
 def write_trade_history(symbols: List[str]) -> None:
@@ -36,7 +79,7 @@ def write_trade_history(symbols: List[str]) -> None:
     '''
     trade_history: List[Dict[str, Any]] = []
     for symbol in symbols:
-        symbol_order_history = binance.get_all_orders(symbol)
+        symbol_order_history = get_default_binance().get_all_orders(symbol)
         trade_history.extend(symbol_order_history)
 
     format_trade_history(trade_history)
@@ -83,7 +126,7 @@ def write_spot_balance() -> None:
     '''
     write latest daily snapshots of spot account to json and excel
     '''
-    spot_balance_payload = binance.get_spot_account_snapshot()
+    spot_balance_payload = get_default_binance().get_spot_account_snapshot()
 
     latest_spot_balance: Dict[str, Union[int, str, Dict]] = spot_balance_payload["snapshotVos"][-1]
     balance_datetime: int = latest_spot_balance["updateTime"]/1000
@@ -94,8 +137,9 @@ def write_spot_balance() -> None:
     filename = "spot_balance"
     excel_filename = f"{filename}_{formatted_balance_datetime}"
 
+    all_ticker_prices = {ticker_price["symbol"]: ticker_price for ticker_price in get_default_binance().get_ticker_prices()}
     ticker_prices = {
-        balance["asset"]: binance.get_ticker_price(balance["asset"] + "USDT")
+        balance["asset"]: all_ticker_prices[balance["asset"] + "USDT"]
         for balance in latest_spot_balance["data"]["balances"]
         if balance["asset"] != "USDT"
     }
@@ -110,18 +154,52 @@ def write_spot_balance() -> None:
 
 
 class Portfolio(object):
-    def __init__(self):
+    def __init__(self, binance: Optional[Client]=None, output_dir: str=".", portfolio_cost_offset: float=0.0):
+        '''
+        `binance` defaults to a client for the credentials in the environment. Every file of the portfolio
+        is read from and written to `output_dir`, so portfolios of several accounts can live side by side.
+        `portfolio_cost_offset` is taken off the portfolio cost, for the cost of the account not held in its balances.
+        '''
         self.base_currency = "USDT"
-        self.coins_filename = "spot_tickers"
-        self.coins: Set[str] = set(read_from_json(self.coins_filename))
-        self.binance: Client = Binance()
-
-        self.spot_order_history: List[Dict[str, Any]] = []
-        self.spot_trades: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.portfolio_cost_offset: float = portfolio_cost_offset
+        self.quote_currencies: Tuple[str, ...] = (self.base_currency, "BUSD")
+        self.conversion_currencies: Tuple[str, ...] = ("FDUSD", "USDC", "BTC", "ETH", "BNB")
+        self.output_dir = output_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.coins_filename = self._output_filename("spot_tickers")
+        self.coins: Set[str] = set(read_from_json(self.coins_filename, default=[]))
+        self.binance: Client = binance or get_default_binance()
+        self.order_cursor_filename = self._output_filename("spot_order_history_cursor")
+        self.order_cursors: Dict[str, Dict[str, int]] = read_from_json(self.order_cursor_filename, default={})
+        self.order_history_filename = self._output_filename("spot_order_history")
+        self.order_store: Optional[sqlite3.Connection] = None
+        self.fill_cursor_filename = self._output_filename("spot_fill_cursor")
+        self.fill_cursors: Dict[str, Dict[str, int]] = read_from_json(self.fill_cursor_filename, default={})
+        self.kline_cache_filename = self._output_filename("kline_cache")
+        self.pnl_history_interval = "1d"
+        self.material_balance_value: float = 1.0      # in base currency, repriced every run by `diff_spot_balance`
+        self.spot_trades_filename = self._output_filename("spot_trades")
+        self.spot_balance_filename = self._output_filename("spot_balance")
+        self.portfolio_summary_filename = self._output_filename("spot_portfolio_summary")
+        self.pnl_history_filename = self._output_filename("spot_pnl_history")
+        # symbols are the same for every account, so the index is shared by all output directories
+        self.symbol_index_filename = "symbol_index"
+        self.symbol_index: Optional[Dict[str, Dict[str, Dict[str, str]]]] = None
+
+        self.spot_order_history: List[SpotOrder] = []
+        self.spot_trades: Dict[str, List[SpotOrder]] = defaultdict(list)
+        self.ticker_aggregates: Optional[Dict[str, Dict[str, float]]] = None
+        self.traded_symbols: Set[str] = set()
+        self.fill_summaries: Optional[List[Dict[str, Any]]] = None
         self.spot_balance: Dict[str, Dict[str, Any]] = []
         self.ticker_prices: Dict[str, Dict[str, str]] = defaultdict(dict)
 
 
+    def _output_filename(self, filename: str) -> str:
+        return os.path.join(self.output_dir, filename) if self.output_dir != "." else filename
+
+
+    @timed("portfolio.update")
     def update(self):
         '''
         Update the portfolio with new data from binance
@@ -130,71 +208,325 @@ class Portfolio(object):
         self._write_spot_balance()
         self._write_spot_order_history()
         self._write_refined_spot_trades()
+        if Switch.check_switch("use_trade_fills"):
+            self._sync_trade_fills()
         self._write_portfolio_summary()
+        if Switch.check_switch("export_pnl_history"):
+            self._write_pnl_history()
+        self._flush_exports()
         log(LogLevel.INFO, "Done with Portfolio update.")
 
 
+    @timed("portfolio.flush_exports")
+    def _flush_exports(self) -> None:
+        '''
+        wait for the json and excel exports the stages of this portfolio queued, which are written while the next stages run
+        '''
+        export_queue.flush(owner=self)
+
+
+    @timed("portfolio.write_refined_spot_trades")
     def _write_refined_spot_trades(self) -> None:
         '''
         write refined spot trades to a json file
         '''
         log(LogLevel.INFO, "Starting refinement of spot trades.")
 
+        if self._use_incremental_summary():
+            self._fold_new_spot_trades()
+            log(LogLevel.INFO, "Successfully refined new spot trades.")
+            if not Switch.check_switch("export_spot_order_history"):
+                return
+            # the refined trades are the FILLED orders of the order store, so they are only exported
+            # along with the full order history, which `self.spot_order_history` then holds
+
         for spot_trade in self.spot_order_history:
             if spot_trade["status"] == "FILLED":                             
                 self.spot_trades[spot_trade["symbol"]].append(resolve_spot_trade(spot_trade))
 
-        write_to_json(self.spot_trades, "spot_trades")
+        queue_export(self.spot_trades, self.spot_trades_filename, excel=False, owner=self)
         log(LogLevel.INFO, "Successfully refined spot trades.")
 
 
+    def _fold_new_spot_trades(self) -> None:
+        '''
+        refine only the orders FILLED since the last run and fold them into the persisted per-symbol aggregates.
+        The refined trades themselves are not kept, as they can be resolved again from the order store.
+        With the vectorized trade engine, the orders are read from the store as columns and folded all at once.
+        '''
+        ticker_aggregates = read_ticker_aggregates(self.order_store)
+        if Switch.check_switch("use_vectorized_trade_engine"):
+            spot_trade_frame = resolve_spot_trade_frame(read_unaggregated_order_frame(self.order_store))
+            fold_ticker_aggregate_frame(ticker_aggregates, spot_trade_frame)
+            aggregated_order_keys = list(zip(spot_trade_frame["symbol"].tolist(), spot_trade_frame["orderId"].tolist()))
+        else:
+            new_filled_orders = [SpotOrder.from_dict(order) for order in read_unaggregated_orders(self.order_store)]
+            format_trade_history(new_filled_orders)
+            fold_ticker_aggregates(ticker_aggregates, [resolve_spot_trade(spot_trade) for spot_trade in new_filled_orders])
+            aggregated_order_keys = [(order["symbol"], order["orderId"]) for order in new_filled_orders]
+        write_ticker_aggregates(self.order_store, ticker_aggregates, aggregated_order_keys)
+        # swapped in once folded, so summaries created meanwhile on another thread see whole aggregates
+        self.ticker_aggregates = ticker_aggregates
+
+
+    @timed("portfolio.write_spot_order_history")
     def _write_spot_order_history(self) -> None:
         '''
-        write the spot trade history of symbol pairs to a json file and excel file
+        write the spot trade history of symbol pairs to the order store, and export it to a json file and excel file
         '''
         log(LogLevel.INFO, "Starting spot trade order history update.")
-        for symbol in self.coins:
-            log(LogLevel.INFO, "Fetching spot order history for symbol: ", symbol)
-            retry = 0
+        if Switch.check_switch("use_symbol_index"):
+            self._load_symbol_index()
+        for symbol_order_history in self.binance.map_concurrently(self._fetch_coin_order_history, self.coins):
+            self.spot_order_history.extend(symbol_order_history)
+        self.traded_symbols = {order["symbol"] for order in self.spot_order_history if float(order["executedQty"])}
+        changed_dates = {partition_date(order["time"]) for order in self.spot_order_history}
+
+        filename = self.order_history_filename
+
+        if Switch.check_switch("use_order_store"):
+            self._sync_order_store(filename)
+            if self._use_incremental_summary() and not Switch.check_switch("export_spot_order_history"):
+                # only the newly fetched orders are needed downstream
+                full_trade_history: List[SpotOrder] = self.spot_order_history
+            else:
+                full_trade_history = [SpotOrder.from_dict(order) for order in read_orders(self.order_store)]
+            format_trade_history(full_trade_history)
+        else:
+            format_trade_history(self.spot_order_history)
+
+            log(LogLevel.INFO, "Fetching old trade order history.")
+            full_trade_history = [SpotOrder.from_dict(order) for order in read_from_json(filename)]
+            reduce_trade_history(full_trade_history, self.spot_order_history)
+
+        self.spot_order_history = full_trade_history
+
+        if not Switch.check_switch("use_order_store") or Switch.check_switch("export_spot_order_history"):
+            queue_export(full_trade_history, filename, owner=self)
+        # the cursors are only moved past orders once the order history holding them is written
+        queue_export(self.order_cursors, self.order_cursor_filename, excel=False, after=(filename,), owner=self)
+        if Switch.check_switch("export_parquet"):
+            self._export_order_history_partitions(changed_dates)
+        log(LogLevel.INFO, "Success updating spot trade order history.")
+
+
+    def _export_order_history_partitions(self, changed_dates: Set[str]) -> None:
+        '''
+        rewrite the date partitions of the parquet order history holding orders new or changed since the last run,
+        or write every partition when there is no parquet order history yet
+        '''
+        if not os.path.exists(f"{self.order_history_filename}.parquet"):
+            orders = self._read_raw_order_history()
+        elif not changed_dates:
+            return
+        elif Switch.check_switch("use_order_store"):
+            orders = [
+                order for date in sorted(changed_dates)
+                for order in read_orders_between(self.order_store, *partition_time_range(date))
+            ]
+        else:
+            orders = [order for order in self._read_raw_order_history() if partition_date(order["time"]) in changed_dates]
+
+        if orders:
+            queue_parquet_export(orders, self.order_history_filename, ORDER_PARQUET_COLUMNS, partition_time_field="time", owner=self)
+
+
+    def _sync_order_store(self, filename: str) -> None:
+        '''
+        upsert the newly fetched orders into the order store, first importing
+        the exported json history when the store is still empty
+        '''
+        self._open_order_store()
+
+        if count_orders(self.order_store) == 0:
+            exported_trade_history: List[Dict[str, Any]] = read_from_json(filename, default=[])
+            log(LogLevel.INFO, f"Importing {len(exported_trade_history)} orders from '{filename}.json' into the order store.")
+            parse_trade_history(exported_trade_history)
+            upsert_orders(self.order_store, exported_trade_history)
+
+        upsert_orders(self.order_store, self.spot_order_history)
+
+
+    def _open_order_store(self) -> None:
+        if self.order_store is None:
+            self.order_store = open_order_store(self.order_history_filename)
+
+
+    def apply_new_orders(self, orders: List[Dict[str, Any]]) -> None:
+        '''
+        add raw orders received outside of the REST sync, e.g. from the user data stream,
+        to the order store and fold the newly FILLED ones into the ticker aggregates.
+        Sync cursors are left alone, so the next REST sync still fetches anything the stream missed.
+        '''
+        self.check_can_apply_new_orders()
+        self._open_order_store()
+        upsert_orders(self.order_store, orders)
+        self._fold_new_spot_trades()
+
+
+    def check_can_apply_new_orders(self) -> None:
+        '''
+        raise when the switches do not allow `apply_new_orders`, so callers can fail before receiving any orders
+        '''
+        if not self._use_incremental_summary():
+            raise RuntimeException("Applying new orders needs the incremental portfolio summary.")
+
+
+    def _fetch_coin_order_history(self, coin: str) -> List[SpotOrder]:
+        '''
+        fetch the new spot orders of `coin` against the first of `self.quote_currencies` it is listed with.
+        With the symbol index only existing pairs are queried. Without it, transient request failures are
+        retried by the client, so only invalid symbols fall through to the next quote.
+        '''
+        log(LogLevel.INFO, "Fetching spot order history for symbol: ", coin)
+        if Switch.check_switch("use_symbol_index"):
+            symbol = find_symbol(self._load_symbol_index(), coin, self.quote_currencies)
+            if symbol is None:
+                log(LogLevel.INFO, f"No {coin} pair quoted in any of: {self.quote_currencies}. Skipping its order history.")
+                return []
+            return self._fetch_new_symbol_orders(symbol)
+
+        *fallback_quote_currencies, last_quote_currency = self.quote_currencies
+        for quote_currency in fallback_quote_currencies:
             try:
-                symbol_order_history = self.binance.get_all_orders(symbol + self.base_currency)
-                self.spot_order_history.extend(symbol_order_history)
+                return self._fetch_new_symbol_orders(coin + quote_currency)
             except ClientException as e:
-                if retry == 0:
-                    retry = 1
-                    log(LogLevel.INFO, "RETRYING WITH BUSD...")
-                    symbol_order_history = self.binance.get_all_orders(symbol + "BUSD")
-                    self.spot_order_history.extend(symbol_order_history)
-                    continue
-                raise e
+                if not is_invalid_symbol_error(e):
+                    raise e
+                log(LogLevel.INFO, f"No {coin + quote_currency} pair. Falling back to the next quote currency...")
 
-        format_trade_history(self.spot_order_history)
+        return self._fetch_new_symbol_orders(coin + last_quote_currency)
 
-        filename = 'spot_order_history'
 
-        log(LogLevel.INFO, "Fetching old trade order history.")
-        full_trade_history: List[Dict[str, Any]] = read_from_json(filename)
-        
-        reduce_trade_history(full_trade_history, self.spot_order_history)
-        self.spot_order_history = full_trade_history
-        
-        write_to_json(full_trade_history, filename)
-        write_to_excel(full_trade_history, filename)
-        log(LogLevel.INFO, "Success updating spot trade order history.")
+    def _load_symbol_index(self) -> Dict[str, Dict[str, Dict[str, str]]]:
+        '''
+        load the index of listed symbols by base and quote asset from its cache file,
+        rebuilding it from exchangeInfo once it is older than `SYMBOL_INDEX_TTL`
+        '''
+        if self.symbol_index is None:
+            with _symbol_index_lock:
+                cached_symbol_index: Dict[str, Any] = read_from_json(self.symbol_index_filename, default={})
+                if timestamp() - cached_symbol_index.get("updatedAt", 0) > SYMBOL_INDEX_TTL:
+                    log(LogLevel.INFO, "Refreshing the symbol index from exchangeInfo.")
+                    cached_symbol_index = {
+                        "updatedAt": timestamp(),
+                        "symbols": create_symbol_index(self.binance.get_exchange_info())
+                    }
+                    write_to_json(cached_symbol_index, self.symbol_index_filename)
+                self.symbol_index = cached_symbol_index["symbols"]
+
+        return self.symbol_index
+
+
+    def _fetch_new_symbol_orders(self, symbol: str) -> List[SpotOrder]:
+        '''
+        fetch the orders of `symbol` newer than its sync cursor, paging by orderId until caught up
+        '''
+        cursor = self.order_cursors.get(symbol)
+        from_order_id = cursor["orderId"] + 1 if cursor else 0
+        log(LogLevel.INFO, f"Fetching orders for symbol: {symbol} from orderId={from_order_id}.")
+
+        symbol_order_history: List[SpotOrder] = []
+        with metrics.timer(f"orders.fetch {symbol}"):
+            while True:
+                orders_page = self.binance.get_all_orders(symbol, order_id=from_order_id, limit=ORDER_HISTORY_PAGE_LIMIT)
+                symbol_order_history.extend(SpotOrder.from_dict(order) for order in orders_page)
+                if len(orders_page) < ORDER_HISTORY_PAGE_LIMIT:
+                    break
+                from_order_id = max(order["orderId"] for order in orders_page) + 1
+        metrics.increment("orders.fetched", len(symbol_order_history))
+
+        update_order_cursor(self.order_cursors, symbol, symbol_order_history)
+        return symbol_order_history
+
+
+    @timed("portfolio.sync_trade_fills")
+    def _sync_trade_fills(self) -> None:
+        '''
+        fetch the new fills of every symbol traded since the last sync into the order store, and summarize
+        every symbol from all of its stored fills, with the commissions actually paid
+        '''
+        log(LogLevel.INFO, "Starting trade fills sync.")
+        # symbols synced before fills were, have their whole fill history fetched once
+        symbols = sorted(self.traded_symbols | (set(self.order_cursors) - set(self.fill_cursors)))
+        new_fills: List[Dict[str, Any]] = []
+        for symbol_fills in self.binance.map_concurrently(self._fetch_new_symbol_fills, symbols):
+            new_fills.extend(symbol_fills)
+
+        self._open_order_store()
+        insert_fills(self.order_store, new_fills)
+        queue_export(self.fill_cursors, self.fill_cursor_filename, excel=False, owner=self)
+
+        fills = read_fills(self.order_store)
+        commission_assets = set(fills["commissionAsset"]) - set(self.quote_currencies)
+        self.fill_summaries = create_fill_summaries(
+            fills, self.quote_currencies, self._get_commission_prices(commission_assets)
+        )
+        log(LogLevel.INFO, "Success syncing trade fills.")
+
+
+    def _fetch_new_symbol_fills(self, symbol: str) -> List[Dict[str, Any]]:
+        '''
+        fetch the fills of `symbol` newer than its fill cursor, paging by trade id until caught up
+        '''
+        cursor = self.fill_cursors.get(symbol)
+        from_id = cursor["id"] + 1 if cursor else 0
+        log(LogLevel.INFO, f"Fetching fills for symbol: {symbol} from id={from_id}.")
+
+        symbol_fills: List[Dict[str, Any]] = []
+        while True:
+            fills_page = self.binance.get_my_trades(symbol, from_id=from_id, limit=FILL_PAGE_LIMIT)
+            symbol_fills.extend(fills_page)
+            if len(fills_page) < FILL_PAGE_LIMIT:
+                break
+            from_id = max(fill["id"] for fill in fills_page) + 1
+        metrics.increment("fills.fetched", len(symbol_fills))
+
+        self.fill_cursors[symbol] = {"id": max((fill["id"] for fill in symbol_fills), default=from_id - 1)}
+        return symbol_fills
 
 
+    def _get_commission_prices(self, commission_assets: Set[str]) -> Dict[str, float]:
+        '''
+        get the current price of every commission asset in the base currency. Binance does not report
+        what a commission paid in e.g. BNB was worth at the time, so it is valued at today's price.
+        '''
+        commission_prices: Dict[str, float] = {
+            asset: float(self.ticker_prices[asset]["price"]) for asset in commission_assets if "price" in self.ticker_prices.get(asset, {})
+        }
+        missing_assets = commission_assets - set(commission_prices)
+        if missing_assets:
+            ticker_prices: Dict[str, Dict[str, str]] = {
+                ticker_price["symbol"]: ticker_price for ticker_price in self.binance.get_ticker_prices()
+            }
+            for asset in missing_assets:
+                try:
+                    commission_prices[asset] = float(
+                        resolve_ticker_price(asset, ticker_prices, self.quote_currencies, self.conversion_currencies)["price"]
+                    )
+                except RuntimeException:
+                    pass    # left out of the fees by `create_fill_summaries`
+
+        return commission_prices
+
+
+    @timed("portfolio.write_spot_balance")
     def _write_spot_balance(self) -> None:
         '''
         write latest daily snapshots of spot account to json and excel
         '''
         log(LogLevel.INFO, "Starting spot balance update.")
-        spot_balance_payload = binance.get_spot_account_snapshot()
+        spot_balance_payload = self.binance.get_spot_account_snapshot()
         latest_spot_balance: Dict[str, Union[int, str, Dict]] = spot_balance_payload["snapshotVos"][-1]
 
         self._update_tickers({
             balance["asset"] for balance in latest_spot_balance["data"]["balances"] 
             if balance["asset"] != self.base_currency
         })
+        if Switch.check_switch("diff_spot_balance"):
+            self._update_changed_spot_balance(latest_spot_balance["data"]["balances"])
+            return
+
         self._get_current_ticker_prices() 
 
         spot_balance: List[Dict[str, Any]] = resolve_spot_balance(
@@ -203,28 +535,191 @@ class Portfolio(object):
         )
         self.spot_balance = {balance["symbol"] : balance for balance in spot_balance}
 
-        filename = "spot_balance"
-        write_to_excel(spot_balance, filename)
-        write_to_json(spot_balance, filename)
+        queue_export(spot_balance, self.spot_balance_filename, owner=self)
+        log(LogLevel.INFO, "Success updating spot balance.")
+
+
+    def _update_changed_spot_balance(self, balances: List[Dict[str, str]]) -> None:
+        '''
+        reprice only the balances that changed since the previous spot balance, or that are worth at least
+        `self.material_balance_value`. Dust that did not move keeps its previous price, and the export is
+        skipped when no balance changed.
+        '''
+        previous_spot_balance: Dict[str, Dict[str, Any]] = self.spot_balance or {
+            balance["symbol"]: balance for balance in read_from_json(self.spot_balance_filename, default=[])
+        }
+        repriced_balances = find_balances_to_reprice(balances, previous_spot_balance, self.material_balance_value)
+        log(LogLevel.INFO, f"Repricing {len(repriced_balances)} of {len(balances)} spot balances.")
+        metrics.increment("balances.repriced", len(repriced_balances))
+
+        if repriced_balances:
+            self._get_current_ticker_prices({balance["asset"] for balance in repriced_balances} - {self.base_currency})
+        repriced_spot_balance = {balance["symbol"]: balance for balance in resolve_spot_balance(repriced_balances, self.ticker_prices)}
+        self.spot_balance = {
+            balance["asset"]: repriced_spot_balance.get(balance["asset"]) or previous_spot_balance[balance["asset"]]
+            for balance in balances
+        }
+
+        if list(self.spot_balance.items()) == list(previous_spot_balance.items()):
+            log(LogLevel.INFO, "No spot balance changed. Skipping its export.")
+            return
+        queue_export(list(self.spot_balance.values()), self.spot_balance_filename, owner=self)
         log(LogLevel.INFO, "Success updating spot balance.")
 
     
+    @timed("portfolio.write_portfolio_summary")
     def _write_portfolio_summary(self) -> None:
         '''
         write spot portfolio summary to a json file and an excel file
         '''
         log(LogLevel.INFO, "Creating spot portfolio summary.")
+        portfolio_summary = self.create_portfolio_summary()
+
+        queue_export(portfolio_summary, self.portfolio_summary_filename, owner=self)
+        if Switch.check_switch("export_parquet"):
+            queue_parquet_export(portfolio_summary, self.portfolio_summary_filename, SUMMARY_PARQUET_COLUMNS, owner=self)
+        log(LogLevel.INFO, "Success creating spot portfolio summary.")
+
+
+    def create_portfolio_summary(self) -> List[Dict[str, Any]]:
+        '''
+        create the spot portfolio summary from the refined spot trades and the current spot balance
+        '''
         portfolio_summary = []
 
-        for ticker, trades in self.spot_trades.items():
-            ticker_summary = create_ticker_summary(ticker.split(self.base_currency)[0], trades)
-            portfolio_summary.append(ticker_summary)
+        if self.fill_summaries is not None:
+            # the fills hold the exact cost paid, so no offset is applied to it
+            return resolve_portfolio_summary(self.fill_summaries, self.spot_balance, portfolio_cost_offset=0.0)
+        if self.ticker_aggregates is not None:
+            portfolio_summary = [
+                create_ticker_summary_from_aggregate(ticker.split(self.base_currency)[0], ticker_aggregate)
+                for ticker, ticker_aggregate in self.ticker_aggregates.items()
+            ]
+        else:
+            for ticker, trades in self.spot_trades.items():
+                ticker_summary = create_ticker_summary(ticker.split(self.base_currency)[0], trades)
+                portfolio_summary.append(ticker_summary)
 
-        portfolio_summary = resolve_portfolio_summary(portfolio_summary, self.spot_balance)
+        return resolve_portfolio_summary(portfolio_summary, self.spot_balance, self.portfolio_cost_offset)
 
-        write_to_json(portfolio_summary, "spot_portfolio_summary")
-        write_to_excel(portfolio_summary, "spot_portfolio_summary")
-        log(LogLevel.INFO, "Success creating spot portfolio summary.")
+
+    @timed("portfolio.write_pnl_history")
+    def _write_pnl_history(self) -> None:
+        '''
+        write the value and pnl of the portfolio at every `self.pnl_history_interval` candle since the first trade
+        to a json file and an excel file. Holdings are rebuilt from the order history and valued at the candle closes
+        in the kline cache, which only fetches the candles it is missing.
+        '''
+        log(LogLevel.INFO, f"Creating {self.pnl_history_interval} spot pnl history.")
+        if self.pnl_history_interval not in KLINE_INTERVALS:
+            raise RuntimeException(f"Unknown pnl history interval: '{self.pnl_history_interval}'. Expected one of: {tuple(KLINE_INTERVALS)}.")
+
+        filled_orders = self._read_filled_orders()
+        if not filled_orders:
+            log(LogLevel.INFO, "No FILLED orders. Skipping the spot pnl history.")
+            return
+
+        first_trade_times: Dict[str, int] = {}
+        for order in filled_orders:
+            first_trade_times[order["symbol"]] = min(order["time"], first_trade_times.get(order["symbol"], order["time"]))
+        end_time = timestamp()
+
+        kline_cache = open_kline_cache(self.kline_cache_filename)
+        try:
+            self._sync_kline_cache(kline_cache, first_trade_times, end_time)
+            kline_closes = read_kline_closes(
+                kline_cache, self.pnl_history_interval, list(first_trade_times), min(first_trade_times.values())
+            )
+        finally:
+            kline_cache.close()
+
+        pnl_history = create_pnl_history(filled_orders, kline_closes, KLINE_INTERVALS[self.pnl_history_interval], end_time)
+        spot_pnl_history = resolve_pnl_history(pnl_history)
+
+        queue_export(spot_pnl_history, self.pnl_history_filename, owner=self)
+        log(LogLevel.INFO, "Success creating spot pnl history.")
+
+
+    def _read_filled_orders(self) -> List[Dict[str, Any]]:
+        '''
+        read the FILLED orders with their timestamps in milliseconds, only loading the columns the pnl history
+        needs from the parquet order history when there is one
+        '''
+        if Switch.check_switch("export_parquet") and os.path.exists(f"{self.order_history_filename}.parquet"):
+            return read_parquet(
+                self.order_history_filename,
+                columns=["symbol", "side", "status", "origQty", "executedQty", "cummulativeQuoteQty", "time"],
+                filters=[("status", "==", "FILLED")]
+            ).to_pylist()
+
+        return [order for order in self._read_raw_order_history() if order["status"] == "FILLED"]
+
+
+    def _read_raw_order_history(self) -> List[Dict[str, Any]]:
+        '''
+        read the full order history with its timestamps in milliseconds, from the order store or the exported json file
+        '''
+        if Switch.check_switch("use_order_store"):
+            self._open_order_store()
+            return read_orders(self.order_store)
+
+        order_history: List[Dict[str, Any]] = read_from_json(self.order_history_filename, default=[])
+        parse_trade_history(order_history)
+        return order_history
+
+
+    def _sync_kline_cache(self, kline_cache: sqlite3.Connection, first_trade_times: Dict[str, int], end_time: int) -> None:
+        '''
+        fetch the candles of every symbol from its first trade up to `end_time` missing from the kline cache
+        '''
+        interval_milliseconds = KLINE_INTERVALS[self.pnl_history_interval]
+        missing_ranges: List[Tuple[str, int, int]] = [
+            (symbol, range_start_time, range_end_time)
+            for symbol, first_trade_time in first_trade_times.items()
+            for range_start_time, range_end_time in find_missing_kline_ranges(
+                read_cached_kline_range(kline_cache, symbol, self.pnl_history_interval),
+                first_trade_time,
+                end_time,
+                interval_milliseconds
+            )
+        ]
+        log(LogLevel.INFO, f"Fetching {len(missing_ranges)} missing kline ranges for {len(first_trade_times)} symbols.")
+
+        # requests run concurrently, but the cache is only written from this thread
+        for symbol, klines in self.binance.map_concurrently(self._fetch_klines, missing_ranges):
+            upsert_klines(kline_cache, symbol, self.pnl_history_interval, klines)
+        metrics.increment("klines.ranges_fetched", len(missing_ranges))
+
+
+    def _fetch_klines(self, kline_range: Tuple[str, int, int]) -> Tuple[str, List[List[Any]]]:
+        '''
+        fetch the candles of a symbol opened between a start and end time, paging by open time
+        '''
+        symbol, start_time, end_time = kline_range
+        klines: List[List[Any]] = []
+        try:
+            while start_time <= end_time:
+                klines_page = self.binance.get_klines(
+                    symbol, self.pnl_history_interval, start_time=start_time, end_time=end_time, limit=KLINE_PAGE_LIMIT
+                )
+                klines.extend(klines_page)
+                if len(klines_page) < KLINE_PAGE_LIMIT:
+                    break
+                start_time = klines_page[-1][0] + 1
+        except ClientException as e:
+            if not is_invalid_symbol_error(e):
+                raise e
+            log(LogLevel.ERROR, f"No klines for delisted symbol: {symbol}. Its holdings are valued at 0.")
+        metrics.increment("klines.fetched", len(klines))
+
+        return symbol, klines
+
+
+    def _use_incremental_summary(self) -> bool:
+        '''
+        the incremental portfolio summary keeps its running aggregates in the order store
+        '''
+        return Switch.check_switch("use_order_store") and Switch.check_switch("use_incremental_portfolio_summary")
 
 
     def _update_tickers(self, balance_tickers: Set[str]) -> None:
@@ -236,18 +731,13 @@ class Portfolio(object):
         log(LogLevel.INFO, f"Updated set of coins to: {self.coins}")
 
 
-    def _get_current_ticker_prices(self) -> None:
+    def _get_current_ticker_prices(self, coins: Optional[Set[str]]=None) -> None:
         '''
-        update `self.ticker_prices` with latest price info for each tick in `self.coins`
+        update `self.ticker_prices` with latest price info for each tick in `coins` (by default `self.coins`),
+        resolved from a single snapshot of all ticker prices
         '''
-        for tick in self.coins:
-            retry = 0
-            try:
-                self.ticker_prices[tick] = binance.get_ticker_price(tick + self.base_currency)
-            except ClientException as e:
-                if retry == 0:
-                    retry = 1
-                    log(LogLevel.INFO, "RETRYING WITH BUSD...")
-                    self.ticker_prices[tick] = binance.get_ticker_price(tick + "BUSD")
-                    continue
-                raise e
\ No newline at end of file
+        ticker_prices: Dict[str, Dict[str, str]] = {
+            ticker_price["symbol"]: ticker_price for ticker_price in self.binance.get_ticker_prices()
+        }
+        for tick in (self.coins if coins is None else coins):
+            self.ticker_prices[tick] = resolve_ticker_price(tick, ticker_prices, self.quote_currencies, self.conversion_currencies)
@@ -1,29 +1,68 @@
-from requests.models import Response
 from businessUtils.errorUtils import ClientException
 from businessUtils.logUtils import LogLevel, log
 
-from typing import Dict, Union, Any 
-from functools import wraps
+from typing import Callable, Dict, Optional, Union, Any
+from functools import lru_cache, wraps
+from urllib.parse import urlencode
 import hashlib
 import hmac
+import json
+import threading
 import time
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+INVALID_SYMBOL_ERROR_CODE = -1121
+TIMESTAMP_ERROR_CODE = -1021        # timestamp outside of recvWindow, i.e. the local clock drifted
+DEFAULT_CLOCK_REFRESH_INTERVAL = 10 * 60.0      # seconds
 
 def format_query_params(query_params: Dict[str, Union[int, str, bool]]) -> str:
     '''
-    format query params from a dictionary to query string format (key1=value1&key2=value2...)
+    format query params from a dictionary to a url encoded query string (key1=value1&key2=value2...)
     '''
-    return "".join(f"&{key}={value}" for key, value in query_params.items())[1:]
+    return urlencode(query_params)
+
+
+class RequestSigner(object):
+    '''
+    Signs query strings with HMAC SHA256. The keyed HMAC state is built once and copied for every
+    signature, so signing a request only hashes the query string itself.
+    '''
+    def __init__(self, secret_key: str):
+        self._hmac = hmac.new(bytes(secret_key, 'latin-1'), digestmod=hashlib.sha256)
+
+
+    def sign(self, value: str) -> str:
+        signature = self._hmac.copy()
+        signature.update(bytes(value, 'latin-1'))
+        return signature.hexdigest().upper()
+
+
+    def sign_params(self, query_params: Dict[str, Union[int, str, bool]]) -> str:
+        '''
+        get the query string of `query_params` with its signature appended, to be sent exactly as signed
+        '''
+        query_string = format_query_params(query_params)
+        return f"{query_string}&signature={self.sign(query_string)}"
+
+
+@lru_cache(maxsize=None)
+def get_request_signer(secret_key: str) -> RequestSigner:
+    '''
+    get the signer of `secret_key`, built on first use.
+    '''
+    return RequestSigner(secret_key)
 
 
 def compute_signature(query_params: Dict[str, Union[int, str, bool]], secret_key: str) -> str:
     '''
     compute a HMAC SHA256 signature with secret key as the key and the query params as the value.
     '''
-    value = format_query_params(query_params)
-    signature = hmac.new(bytes(secret_key, 'latin-1'), msg=bytes(value, 'latin-1'), digestmod=hashlib.sha256).hexdigest().upper()
-    
-    return signature
+    return get_request_signer(secret_key).sign(format_query_params(query_params))
 
 
 def timestamp() -> int:
@@ -33,19 +72,116 @@ def timestamp() -> int:
     return int(time.time() * 1000)
 
 
+class ServerClock(object):
+    '''
+    Gives timestamps in the server's time, from the offset of the server clock to the local one.
+    The offset is measured on the first timestamp and then refreshed every `refresh_interval` seconds
+    on a background thread, so signed requests are not rejected when the local clock drifts.
+    '''
+    def __init__(self, get_server_time: Callable[[], int], refresh_interval: float=DEFAULT_CLOCK_REFRESH_INTERVAL):
+        self.get_server_time: Callable[[], int] = get_server_time
+        self.refresh_interval: float = refresh_interval
+        self.offset: int = 0
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+
+    def sync(self) -> None:
+        '''
+        measure the offset of the server clock, taking the server time as read halfway through the request
+        '''
+        request_time = timestamp()
+        server_time = self.get_server_time()
+        response_time = timestamp()
+        self.offset = server_time - (request_time + response_time) // 2
+        log(LogLevel.INFO, f"Server clock offset is {self.offset}ms.")
+
+
+    def timestamp(self) -> int:
+        '''
+        return the current server timestamp in milliseconds.
+        '''
+        if self._refresh_thread is None:
+            with self._lock:
+                if self._refresh_thread is None:
+                    self.try_sync()
+                    self._refresh_thread = threading.Thread(target=self._refresh_periodically, name="server-clock", daemon=True)
+                    self._refresh_thread.start()
+
+        return timestamp() + self.offset
+
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+    def try_sync(self) -> bool:
+        '''
+        sync like `sync`, keeping the current offset when the server time cannot be read. Returns whether it synced.
+        '''
+        try:
+            self.sync()
+            return True
+        except Exception as e:
+            log(LogLevel.ERROR, f"Failed to sync the server clock: {e}. Keeping an offset of {self.offset}ms.")
+            return False
+
+
+    def _refresh_periodically(self) -> None:
+        while not self._stop_event.wait(self.refresh_interval):
+            self.try_sync()
+
+
 def is_success_response(status_code: int) -> bool:
     return status_code == 200
 
 
+def is_invalid_symbol_error(exception: ClientException) -> bool:
+    '''
+    check if a client exception was raised for a symbol that does not exist on binance.
+    '''
+    error_payload = exception.args[0] if exception.args else None
+    return isinstance(error_payload, dict) and error_payload.get("code") == INVALID_SYMBOL_ERROR_CODE
+
+
+def is_timestamp_error(error_payload: Any) -> bool:
+    '''
+    check if an error payload rejects a signed request for a timestamp out of sync with the server.
+    '''
+    return isinstance(error_payload, dict) and error_payload.get("code") == TIMESTAMP_ERROR_CODE
+
+
+def encode_json(payload: Any) -> bytes:
+    '''
+    encode a JSON payload compactly, using orjson when it is installed.
+    '''
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def decode_json(content: bytes) -> Any:
+    '''
+    decode a JSON response body, using orjson when it is installed.
+    '''
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
 def http_request(request_function) -> Any:
-    ''' base internal method for sending HTTP requests'''
+    '''
+    base internal method for sending HTTP requests.
+    `request_function` returns the response together with its body decoded once.
+    '''
     @wraps(request_function)
     def func(*args, **kwargs):
         try:
-            response :Response = request_function(*args, **kwargs)
+            response, payload = request_function(*args, **kwargs)
             if is_success_response(response.status_code):
-                return response.json()
-            raise ClientException(response.json())
+                return payload
+            raise ClientException(payload)
         except Exception as e:
             log(LogLevel.ERROR, str(e))
             raise e
@@ -1,39 +1,783 @@
-from businessUtils.apiUtils import timestamp
+from businessUtils.apiUtils import decode_json, timestamp
+from businessUtils.errorUtils import RuntimeException
 from businessUtils.logUtils import LogLevel, log
+from businessUtils.metricsUtils import metrics, timed
 
-from typing import Dict, List, Union, Any
-import pandas as pd
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple, Union, Any
+import atexit
+import calendar
+import hashlib
 import json
+import os
+import sqlite3
+import threading
+import time
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-def write_to_json(json_object: Union[List, Dict], filename: str, replace_existing: bool=True) -> None:
+# pandas, openpyxl and pyarrow take longer to import than a short run takes, so they are imported when first used.
+# pyarrow is optional and only needed for the parquet exports
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+
+DEFAULT_EXPORT_WORKERS = 2
+EXPORT_FINGERPRINTS_FILENAME = ".export_fingerprints"
+_export_fingerprints: Dict[str, Dict[str, str]] = {}
+_export_fingerprints_lock = threading.RLock()
+
+
+ORDER_STORE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS orders (
+    symbol TEXT NOT NULL,
+    orderId INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    updateTime INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (symbol, orderId)
+);
+CREATE INDEX IF NOT EXISTS orders_order_id ON orders (orderId);
+CREATE INDEX IF NOT EXISTS orders_time ON orders (time);
+CREATE TABLE IF NOT EXISTS ticker_aggregates (
+    symbol TEXT PRIMARY KEY,
+    origQty REAL NOT NULL,
+    actualQty REAL NOT NULL,
+    totalCost REAL NOT NULL,
+    actualCost REAL NOT NULL,
+    totalSaleQty REAL NOT NULL,
+    totalSaleValue REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fills (
+    symbol TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    orderId INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    isBuyer INTEGER NOT NULL,
+    price TEXT NOT NULL,
+    qty TEXT NOT NULL,
+    quoteQty TEXT NOT NULL,
+    commission TEXT NOT NULL,
+    commissionAsset TEXT NOT NULL,
+    PRIMARY KEY (symbol, id)
+) WITHOUT ROWID;
+'''
+
+# FILLED orders not yet folded into ticker_aggregates have aggregated = 0
+ORDER_STORE_AGGREGATED_COLUMN_SCHEMA = '''
+ALTER TABLE orders ADD COLUMN aggregated INTEGER NOT NULL DEFAULT 0;
+'''
+ORDER_STORE_AGGREGATED_INDEX_SCHEMA = '''
+CREATE INDEX IF NOT EXISTS orders_unaggregated ON orders (status, aggregated);
+'''
+
+TICKER_AGGREGATE_FIELDS = ("origQty", "actualQty", "totalCost", "actualCost", "totalSaleQty", "totalSaleValue")
+SPOT_TRADE_FRAME_COLUMNS = ("symbol", "side", "origQty", "executedQty", "cummulativeQuoteQty")
+SPOT_TRADE_FRAME_DECIMAL_COLUMNS = ("origQty", "executedQty", "cummulativeQuoteQty")
+
+UPSERT_TICKER_AGGREGATE_SQL = f'''
+INSERT INTO ticker_aggregates (symbol, {", ".join(TICKER_AGGREGATE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (symbol) DO UPDATE SET {", ".join(f"{field} = excluded.{field}" for field in TICKER_AGGREGATE_FIELDS)}
+'''
+
+# decimals are kept as binance's strings, so commissions are stored exactly
+FILL_FIELDS = ("symbol", "id", "orderId", "time", "isBuyer", "price", "qty", "quoteQty", "commission", "commissionAsset")
+FILL_DECIMAL_FIELDS = ("price", "qty", "quoteQty", "commission")
+
+# fills never change once made, so a fill fetched twice is stored once
+INSERT_FILL_SQL = f'''
+INSERT OR IGNORE INTO fills ({", ".join(FILL_FIELDS)}) VALUES ({", ".join("?" * len(FILL_FIELDS))})
+'''
+
+KLINE_CACHE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS klines (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    openTime INTEGER NOT NULL,
+    close REAL NOT NULL,
+    PRIMARY KEY (symbol, interval, openTime)
+) WITHOUT ROWID;
+'''
+
+UPSERT_KLINE_SQL = '''
+INSERT INTO klines (symbol, interval, openTime, close) VALUES (?, ?, ?, ?)
+ON CONFLICT (symbol, interval, openTime) DO UPDATE SET close = excluded.close
+'''
+
+RESPONSE_CACHE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    expiresAt REAL NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expiresAt);
+'''
+
+# explicit parquet schemas, as (column, pyarrow type alias). Decimals are written as doubles and
+# timestamps as milliseconds, like the order store holds them
+ORDER_PARQUET_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("symbol", "string"),
+    ("orderId", "int64"),
+    ("orderListId", "int64"),
+    ("clientOrderId", "string"),
+    ("price", "double"),
+    ("origQty", "double"),
+    ("executedQty", "double"),
+    ("cummulativeQuoteQty", "double"),
+    ("status", "string"),
+    ("timeInForce", "string"),
+    ("type", "string"),
+    ("side", "string"),
+    ("stopPrice", "double"),
+    ("icebergQty", "double"),
+    ("time", "int64"),
+    ("updateTime", "int64"),
+    ("isWorking", "bool"),
+    ("origQuoteOrderQty", "double")
+)
+SUMMARY_PARQUET_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("symbol", "string"),
+    ("date", "string"),
+    *((field, "double") for field in TICKER_AGGREGATE_FIELDS),
+    ("fees", "double"),
+    ("averageCost", "double"),
+    ("costBasis", "double"),
+    ("balanceQty", "double"),
+    ("price", "double"),
+    ("actualValue", "double"),
+    ("locked", "double"),
+    ("totalQty", "double"),
+    ("totalValue", "double"),
+    ("pnl", "double"),
+    ("pnl%", "string"),
+    ("portfolioCost", "double"),
+    ("portfolioValue", "double"),
+    ("portfolioPNL", "double"),
+    ("portfolioPNL%", "string")
+)
+PARQUET_PARTITION_COLUMN = "date"
+_PARQUET_CONVERTERS: Dict[str, Callable[[Any], Any]] = {"string": str, "int64": int, "double": float, "bool": bool}
+
+UPSERT_ORDER_SQL = '''
+INSERT INTO orders (symbol, orderId, time, updateTime, status, payload) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (symbol, orderId) DO UPDATE SET
+    time = excluded.time,
+    updateTime = excluded.updateTime,
+    status = excluded.status,
+    payload = excluded.payload
+WHERE orders.updateTime != excluded.updateTime OR orders.status != excluded.status
+'''
+
+
+def _to_record(record: Any) -> Any:
+    '''
+    records kept in a compact form, like `SpotOrder`, are exported through their `to_dict`.
     '''
-    write a json object to a json file.
+    if hasattr(record, "to_dict"):
+        return record.to_dict()
+    raise TypeError(f"Object of type {type(record).__name__} is not JSON serializable")
+
+
+def _encode_json(json_object: Union[List, Dict], indent: Optional[int]=None) -> bytes:
+    '''
+    serialize a json object in one pass, with orjson when it is installed and no indent is needed.
+    '''
+    if orjson is not None and indent is None:
+        return orjson.dumps(json_object, default=_to_record)
+    separators = (",", ":") if indent is None else None
+    return json.dumps(json_object, indent=indent, separators=separators, default=_to_record).encode("utf-8")
+
+
+def _load_export_fingerprints() -> Dict[str, str]:
+    '''
+    load the fingerprints of the last written exports in the working directory, once per process.
+    '''
+    fingerprints_path = os.path.abspath(f"{EXPORT_FINGERPRINTS_FILENAME}.json")
+    if fingerprints_path not in _export_fingerprints:
+        _export_fingerprints[fingerprints_path] = read_from_json(EXPORT_FINGERPRINTS_FILENAME, default={})
+    return _export_fingerprints[fingerprints_path]
+
+
+def _is_unchanged_export(export_filename: str, fingerprint: str) -> bool:
+    '''
+    check if `export_filename` exists and was last written from data with the same fingerprint.
+    '''
+    with _export_fingerprints_lock:
+        return os.path.exists(export_filename) and _load_export_fingerprints().get(export_filename) == fingerprint
+
+
+def _save_export_fingerprint(export_filename: str, fingerprint: str) -> None:
+    with _export_fingerprints_lock:
+        export_fingerprints = _load_export_fingerprints()
+        export_fingerprints[export_filename] = fingerprint
+        with _atomic_path(f"{EXPORT_FINGERPRINTS_FILENAME}.json") as temporary_filename:
+            with open(temporary_filename, 'w') as file:
+                json.dump(export_fingerprints, file)
+
+
+@contextmanager
+def _atomic_path(filename: str) -> Iterator[str]:
+    '''
+    yield a temporary file name next to `filename`, with the same extension, that replaces `filename` once
+    written. A crash mid write leaves the previous file in place rather than a truncated one.
+    '''
+    base_filename, extension = os.path.splitext(filename)
+    temporary_filename = f"{base_filename}.{os.getpid()}-{threading.get_ident()}.tmp{extension}"
+    try:
+        yield temporary_filename
+        os.replace(temporary_filename, filename)
+    finally:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+
+
+def _write_json_file(serialized_object: bytes, filename: str, skip_unchanged: bool, replace_existing: bool=True) -> None:
+    fingerprint = hashlib.sha1(serialized_object).hexdigest()
+    if skip_unchanged and _is_unchanged_export(f"{filename}.json", fingerprint):
+        log(LogLevel.INFO, f"Skipping JSON file: '{filename}.json'. Data is unchanged since the last write.")
+        return
+
+    log(LogLevel.INFO, f"Writing to JSON file: '{filename}.json' with replace_existing={replace_existing}.")
+    with _atomic_path(f"{filename}.json") as temporary_filename:
+        with open(temporary_filename, 'wb') as file:
+            file.write(serialized_object)
+    _save_export_fingerprint(f"{filename}.json", fingerprint)
+
+
+@timed("export.json")
+def write_to_json(
+    json_object: Union[List, Dict],
+    filename: str,
+    replace_existing: bool=True,
+    indent: Optional[int]=None,
+    skip_unchanged: bool=True
+) -> None:
+    '''
+    write a json object to a compact json file (or an indented one when `indent` is given).
+    Rewriting an existing file with unchanged data is skipped when `skip_unchanged` is set.
     '''
     if not replace_existing:
         filename = f"{filename}_{str(timestamp())}"
 
-    with open(f"{filename}.json", 'w') as file:
-        log(LogLevel.INFO, f"Writing to JSON file: '{filename}.json' with replace_existing={replace_existing}.")
-        json.dump(json_object, file, indent=4)
+    _write_json_file(_encode_json(json_object, indent), filename, skip_unchanged, replace_existing)
+
+
+def _excel_cell(value: Any) -> Any:
+    '''
+    excel cells only hold scalars, so nested values are written as their string form.
+    '''
+    return str(value) if isinstance(value, (dict, list, tuple, set)) else value
 
 
-def write_to_excel(json_object: Union[List, Dict], filename: str, replace_existing: bool=True) -> None:
+def _excel_rows(records: List[Dict[str, Any]], columns: List[str]) -> Iterator[List[Any]]:
+    '''
+    generate the header and indexed rows of `records`, laid out like `pandas.DataFrame.to_excel`.
+    '''
+    yield [None, *columns]
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            record = _to_record(record)
+        yield [index, *(_excel_cell(record.get(column)) for column in columns)]
+
+
+def _write_excel_file(
+    load_json_object: Callable[[], Union[List, Dict]],
+    filename: str,
+    fingerprint: str,
+    skip_unchanged: bool,
+    replace_existing: bool=True
+) -> None:
+    '''
+    write the json object given by `load_json_object` to an excel file, only loading it when the write is not skipped.
+    '''
+    if skip_unchanged and _is_unchanged_export(f"{filename}.xlsx", fingerprint):
+        log(LogLevel.INFO, f"Skipping EXCEL file: '{filename}.xlsx'. Data is unchanged since the last write.")
+        return
+
+    log(LogLevel.INFO, f"Writing to EXCEL file: '{filename}.xlsx' with replace_existing={replace_existing}.")
+    json_object = load_json_object()
+    with _atomic_path(f"{filename}.xlsx") as temporary_filename:
+        if isinstance(json_object, dict):
+            import pandas as pd
+            pd.DataFrame(json_object).to_excel(temporary_filename)
+        else:
+            from openpyxl import Workbook
+
+            # columns in order of first appearance, like pandas
+            columns = list(dict.fromkeys(column for record in json_object for column in record))
+            workbook = Workbook(write_only=True)
+            worksheet = workbook.create_sheet("Sheet1")
+            for row in _excel_rows(json_object, columns):
+                worksheet.append(row)
+            workbook.save(temporary_filename)
+    _save_export_fingerprint(f"{filename}.xlsx", fingerprint)
+
+
+@timed("export.excel")
+def write_to_excel(
+    json_object: Union[List, Dict],
+    filename: str,
+    replace_existing: bool=True,
+    skip_unchanged: bool=True
+) -> None:
     '''
     write a json object to an excel file (*.xlsx).
+    Lists of records are streamed row by row into a write-only workbook.
+    Rewriting an existing file with unchanged data is skipped when `skip_unchanged` is set.
     '''
     if not replace_existing:
         filename = f"{filename}_{str(timestamp())}"
 
-    log(LogLevel.INFO, f"Writing to EXCEL file: '{filename}.xlsx' with replace_existing={replace_existing}.")
-    pd.DataFrame(json_object).to_excel(f"{filename}.xlsx")
+    fingerprint = hashlib.sha1(_encode_json(json_object)).hexdigest()
+    _write_excel_file(lambda: json_object, filename, fingerprint, skip_unchanged, replace_existing)
+
+
+class ExportQueue(object):
+    '''
+    Writes exports on background worker threads, off the critical path of the network stages.
+    Exports of the same file are written in the order they were queued, and an export can wait
+    for the exports of other files first. Every export belongs to an `owner`, e.g. the portfolio
+    that queued it, and `flush` waits for the exports of one owner and raises the first failure.
+    '''
+    def __init__(self, max_workers: int=DEFAULT_EXPORT_WORKERS):
+        self.max_workers: int = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._owners: Dict[str, Optional[object]] = {}
+        self._lock = threading.Lock()
+
+
+    def submit(
+        self,
+        filename: str,
+        write: Callable[[], None],
+        after: Tuple[str, ...]=(),
+        owner: Optional[object]=None
+    ) -> None:
+        '''
+        queue `write` of `filename` for `owner`, to run once the exports already queued for `filename` and the `after` files are written
+        '''
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="export")
+            # queued earlier, so these are picked up by a worker before this export
+            previous_exports = [self._pending[name] for name in (filename, *after) if name in self._pending]
+            self._pending[filename] = self._executor.submit(self._write, filename, write, previous_exports)
+            self._owners[filename] = owner
+
+
+    @staticmethod
+    def _write(filename: str, write: Callable[[], None], previous_exports: List[Future]) -> None:
+        for previous_export in previous_exports:
+            previous_export.result()
+        try:
+            write()
+        except Exception as e:
+            log(LogLevel.ERROR, f"Failed to export: '{filename}'. {e}")
+            raise e
+
+
+    def wait(self, filename: str) -> None:
+        '''
+        wait for the exports queued for `filename`, so reading it gives the latest data
+        '''
+        with self._lock:
+            export = self._pending.get(filename)
+        if export is not None:
+            export.result()
+
+
+    def flush(self, owner: Optional[object]=None) -> None:
+        '''
+        wait for the exports queued for `owner`, or for every queued export when no owner is given, raising the first failure.
+        Exports of other owners, e.g. the portfolios of other accounts, are left to them.
+        '''
+        with self._lock:
+            pending = {
+                filename: export for filename, export in self._pending.items()
+                if owner is None or self._owners[filename] is owner
+            }
+        try:
+            for export in pending.values():
+                export.result()
+        finally:
+            with self._lock:
+                for filename, export in pending.items():
+                    # exports queued meanwhile stay pending
+                    if self._pending.get(filename) is export and export.done():
+                        del self._pending[filename]
+                        del self._owners[filename]
+
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            pass    # already logged by the failed export
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+export_queue = ExportQueue()
+atexit.register(export_queue.close)
+
+
+def queue_export(
+    json_object: Union[List, Dict],
+    filename: str,
+    excel: bool=True,
+    after: Tuple[str, ...]=(),
+    owner: Optional[object]=None
+) -> None:
+    '''
+    queue the export of a json object to `{filename}.json`, and to `{filename}.xlsx` when `excel` is set, on the `export_queue` for `owner`.
+    The object is serialized before this returns, so it can change while the files are written.
+    '''
+    serialized_object = _encode_json(json_object)
+
+    def write() -> None:
+        with metrics.timer("export.json"):
+            _write_json_file(serialized_object, filename, skip_unchanged=True)
+        if excel:
+            with metrics.timer("export.excel"):
+                fingerprint = hashlib.sha1(serialized_object).hexdigest()
+                _write_excel_file(lambda: decode_json(serialized_object), filename, fingerprint, skip_unchanged=True)
+
+    export_queue.submit(filename, write, after, owner)
+
+
+def _import_pyarrow() -> Tuple[Any, Any]:
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeException("Parquet exports need pyarrow. Install it with: pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+def partition_date(time_milliseconds: int) -> str:
+    '''
+    get the UTC date (YYYY-MM-DD) of the parquet partition holding a timestamp in milliseconds.
+    '''
+    return time.strftime("%Y-%m-%d", time.gmtime(time_milliseconds / 1000))
+
+
+def partition_time_range(date: str) -> Tuple[int, int]:
+    '''
+    get the first millisecond of the UTC `date` partition and the first one after it.
+    '''
+    start_time = calendar.timegm(time.strptime(date, "%Y-%m-%d")) * 1000
+    return start_time, start_time + 86_400_000
 
 
-def read_from_json(filename: str) -> Union[List, Dict]:
+def _parquet_table(records: List[Any], columns: Tuple[Tuple[str, str], ...]) -> "pa.Table":
     '''
-    reads data from a json file
+    build a table of `records` with the schema of `columns`. Missing fields are null.
     '''
+    pa, _ = _import_pyarrow()
+    records = [record if isinstance(record, dict) else _to_record(record) for record in records]
+    schema = pa.schema([(name, pa.type_for_alias(alias)) for name, alias in columns])
+    return pa.table({
+        name: [None if record.get(name) is None else _PARQUET_CONVERTERS[alias](record[name]) for record in records]
+        for name, alias in columns
+    }, schema=schema)
+
+
+def _write_parquet_table(table: "pa.Table", filename: str, partition_time_field: Optional[str]) -> None:
+    pa, pq = _import_pyarrow()
+    if partition_time_field is None:
+        log(LogLevel.INFO, f"Writing to PARQUET file: '{filename}.parquet'.")
+        with _atomic_path(f"{filename}.parquet") as temporary_filename:
+            pq.write_table(table, temporary_filename)
+        return
+
+    dates = [partition_date(time_milliseconds) for time_milliseconds in table.column(partition_time_field).to_pylist()]
+    log(LogLevel.INFO, f"Writing {len(set(dates))} date partitions to PARQUET dataset: '{filename}.parquet'.")
+    pq.write_to_dataset(
+        table.append_column(PARQUET_PARTITION_COLUMN, pa.array(dates, pa.string())),
+        f"{filename}.parquet",
+        partition_cols=[PARQUET_PARTITION_COLUMN],
+        existing_data_behavior="delete_matching"
+    )
+
+
+def queue_parquet_export(
+    records: List[Any],
+    filename: str,
+    columns: Tuple[Tuple[str, str], ...],
+    partition_time_field: Optional[str]=None,
+    after: Tuple[str, ...]=(),
+    owner: Optional[object]=None
+) -> None:
+    '''
+    queue the export of `records` with the schema of `columns` to `{filename}.parquet` on the `export_queue` for `owner`.
+    With `partition_time_field`, `{filename}.parquet` is a dataset partitioned by the UTC date of that field:
+    the partitions of the dates in `records` are replaced and the others kept, so `records` must hold every
+    record of the dates it touches. The table is built before this returns, so the records can change meanwhile.
+    '''
+    table = _parquet_table(records, columns)
+
+    def write() -> None:
+        with metrics.timer("export.parquet"):
+            _write_parquet_table(table, filename, partition_time_field)
+
+    export_queue.submit(f"{filename}.parquet", write, after, owner)
+
+
+@timed("import.parquet")
+def read_parquet(filename: str, columns: Optional[List[str]]=None, filters: Optional[List[Tuple[str, str, Any]]]=None) -> "pa.Table":
+    '''
+    read `{filename}.parquet` memory mapped, loading only `columns` (all by default) of the rows matching `filters`,
+    e.g. [("status", "==", "FILLED"), ("date", ">=", "2021-01-01")]. Filters on the date of a partitioned
+    dataset skip the partitions that do not match. Exports of the file still on the `export_queue` are written first.
+    '''
+    _, pq = _import_pyarrow()
+    export_queue.wait(f"{filename}.parquet")
+    log(LogLevel.INFO, f"Reading from PARQUET file: '{filename}.parquet'.")
+    return pq.read_table(f"{filename}.parquet", columns=columns, filters=filters, memory_map=True)
+
+
+@timed("import.json")
+def read_from_json(filename: str, default: Union[List, Dict, None]=None) -> Union[List, Dict]:
+    '''
+    reads data from a json file, returning `default` instead when it is given and the file does not exist yet.
+    Exports of the file still on the `export_queue` are written first.
+    '''
+    export_queue.wait(filename)
+    if default is not None and not os.path.exists(f"{filename}.json"):
+        log(LogLevel.INFO, f"JSON file: '{filename}.json' does not exist. Using default.")
+        return default
+
     with open(f"{filename}.json", 'r') as json_file:
         log(LogLevel.INFO, f"Reading from JSON file: '{filename}.json'.")
         return json.load(json_file)
 
+
+def open_order_store(filename: str) -> sqlite3.Connection:
+    '''
+    open the SQLite order store `{filename}.db`, creating its tables and indexes if needed.
+    '''
+    log(LogLevel.INFO, f"Opening order store: '{filename}.db'.")
+    connection = sqlite3.connect(f"{filename}.db", check_same_thread=False)
+    connection.executescript(ORDER_STORE_SCHEMA)
+    order_columns = {column_info[1] for column_info in connection.execute("PRAGMA table_info(orders)")}
+    if "aggregated" not in order_columns:
+        connection.executescript(ORDER_STORE_AGGREGATED_COLUMN_SCHEMA)
+    connection.executescript(ORDER_STORE_AGGREGATED_INDEX_SCHEMA)
+    return connection
+
+
+@timed("store.upsert")
+def upsert_orders(connection: sqlite3.Connection, orders: List[Dict[str, Any]]) -> int:
+    '''
+    insert raw binance `orders` (timestamps in milliseconds) into the order store, replacing stored orders
+    with the same symbol and orderId only when their status or updateTime changed.
+    Returns the number of orders inserted or replaced.
+    '''
+    total_changes = connection.total_changes
+    with connection:
+        connection.executemany(UPSERT_ORDER_SQL, (
+            (order["symbol"], order["orderId"], order["time"], order["updateTime"], order["status"], json.dumps(order, default=_to_record))
+            for order in orders
+        ))
+    changed_orders = connection.total_changes - total_changes
+    log(LogLevel.INFO, f"Upserted {len(orders)} orders into the order store, {changed_orders} of them new or changed.")
+    return changed_orders
+
+
+def count_orders(connection: sqlite3.Connection) -> int:
+    '''
+    count the orders in the order store.
+    '''
+    return connection.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+
+@timed("store.read")
+def read_orders(connection: sqlite3.Connection) -> List[Dict[str, Any]]:
+    '''
+    read every order in the order store, sorted by time.
+    '''
+    log(LogLevel.INFO, "Reading orders from the order store.")
+    return [json.loads(payload) for (payload,) in connection.execute("SELECT payload FROM orders ORDER BY time, orderId")]
+
+
+@timed("store.read")
+def read_orders_between(connection: sqlite3.Connection, start_time: int, end_time: int) -> List[Dict[str, Any]]:
+    '''
+    read the orders in the order store placed from `start_time` up to, not including, `end_time` (in milliseconds), sorted by time.
+    '''
+    return [
+        json.loads(payload) for (payload,) in connection.execute(
+            "SELECT payload FROM orders WHERE time >= ? AND time < ? ORDER BY time, orderId", (start_time, end_time)
+        )
+    ]
+
+
+@timed("store.read")
+def read_unaggregated_orders(connection: sqlite3.Connection) -> List[Dict[str, Any]]:
+    '''
+    read the FILLED orders not yet folded into the ticker aggregates, sorted by time.
+    '''
+    return [
+        json.loads(payload) for (payload,) in connection.execute(
+            "SELECT payload FROM orders WHERE status = 'FILLED' AND aggregated = 0 ORDER BY time, orderId"
+        )
+    ]
+
+
+@timed("store.read")
+def read_unaggregated_order_frame(connection: sqlite3.Connection) -> "pd.DataFrame":
+    '''
+    read the FILLED orders not yet folded into the ticker aggregates as a frame of the columns of `SPOT_TRADE_FRAME_COLUMNS`
+    and orderId, sorted by time. The fields are extracted by SQLite, so no order is loaded into a dict.
+    '''
+    import pandas as pd
+    payload_columns = ", ".join(
+        f"json_extract(payload, '$.{column}') AS {column}" for column in SPOT_TRADE_FRAME_COLUMNS if column != "symbol"
+    )
+    frame = pd.read_sql_query(
+        f"SELECT symbol, orderId, {payload_columns} FROM orders WHERE status = 'FILLED' AND aggregated = 0 ORDER BY time, orderId",
+        connection
+    )
+    return frame.astype({column: float for column in SPOT_TRADE_FRAME_DECIMAL_COLUMNS})
+
+
+def read_ticker_aggregates(connection: sqlite3.Connection) -> Dict[str, Dict[str, float]]:
+    '''
+    read the running aggregates of every symbol, in the order the symbols were first aggregated.
+    '''
+    return {
+        symbol: dict(zip(TICKER_AGGREGATE_FIELDS, aggregate))
+        for symbol, *aggregate in connection.execute(
+            f"SELECT symbol, {', '.join(TICKER_AGGREGATE_FIELDS)} FROM ticker_aggregates ORDER BY rowid"
+        )
+    }
+
+
+@timed("store.upsert")
+def write_ticker_aggregates(
+    connection: sqlite3.Connection,
+    ticker_aggregates: Dict[str, Dict[str, float]],
+    aggregated_order_keys: List[Tuple[str, int]]
+) -> None:
+    '''
+    save the running `ticker_aggregates` and mark the orders folded into them, by symbol and orderId, in one transaction.
+    '''
+    log(LogLevel.INFO, f"Saving ticker aggregates with {len(aggregated_order_keys)} newly aggregated orders.")
+    with connection:
+        connection.executemany(UPSERT_TICKER_AGGREGATE_SQL, (
+            (symbol, *(aggregate[field] for field in TICKER_AGGREGATE_FIELDS))
+            for symbol, aggregate in ticker_aggregates.items()
+        ))
+        connection.executemany("UPDATE orders SET aggregated = 1 WHERE symbol = ? AND orderId = ?", aggregated_order_keys)
+
+
+@timed("store.upsert")
+def insert_fills(connection: sqlite3.Connection, fills: List[Dict[str, Any]]) -> int:
+    '''
+    insert raw binance myTrades `fills` into the order store, skipping fills already stored.
+    Returns the number of fills inserted.
+    '''
+    total_changes = connection.total_changes
+    with connection:
+        connection.executemany(INSERT_FILL_SQL, (tuple(fill[field] for field in FILL_FIELDS) for fill in fills))
+    inserted_fills = connection.total_changes - total_changes
+    log(LogLevel.INFO, f"Inserted {inserted_fills} of {len(fills)} fills into the order store.")
+    return inserted_fills
+
+
+@timed("store.read")
+def read_fills(connection: sqlite3.Connection) -> "pd.DataFrame":
+    '''
+    read every fill in the order store as a frame, sorted by symbol, time and id, with its decimals parsed to floats.
+    '''
+    import pandas as pd
+    fills = pd.read_sql_query(f"SELECT {', '.join(FILL_FIELDS)} FROM fills ORDER BY symbol, time, id", connection)
+    return fills.astype({field: float for field in FILL_DECIMAL_FIELDS})
+
+
+def open_kline_cache(filename: str) -> sqlite3.Connection:
+    '''
+    open the SQLite kline cache `{filename}.db`, creating its table if needed.
+    '''
+    log(LogLevel.INFO, f"Opening kline cache: '{filename}.db'.")
+    connection = sqlite3.connect(f"{filename}.db", check_same_thread=False)
+    connection.executescript(KLINE_CACHE_SCHEMA)
+    return connection
+
+
+@timed("store.upsert")
+def upsert_klines(connection: sqlite3.Connection, symbol: str, interval: str, klines: List[List[Any]]) -> None:
+    '''
+    insert raw binance `klines` of `symbol` into the kline cache, replacing cached candles with the same open time.
+    '''
+    with connection:
+        connection.executemany(UPSERT_KLINE_SQL, (
+            (symbol, interval, kline[0], float(kline[4])) for kline in klines
+        ))
+
+
+def read_cached_kline_range(connection: sqlite3.Connection, symbol: str, interval: str) -> Optional[Tuple[int, int]]:
+    '''
+    read the open times of the first and last cached candles of `symbol`, or None when none are cached.
+    '''
+    first_open_time, last_open_time = connection.execute(
+        "SELECT MIN(openTime), MAX(openTime) FROM klines WHERE symbol = ? AND interval = ?", (symbol, interval)
+    ).fetchone()
+    return None if first_open_time is None else (first_open_time, last_open_time)
+
+
+@timed("store.read")
+def read_kline_closes(connection: sqlite3.Connection, interval: str, symbols: List[str], start_time: int=0) -> "pd.DataFrame":
+    '''
+    read the cached closes of `symbols` from `start_time` on, as a frame of symbol, openTime and close.
+    '''
+    import pandas as pd
+    return pd.read_sql_query(
+        f"SELECT symbol, openTime, close FROM klines WHERE interval = ? AND openTime >= ? AND symbol IN ({', '.join('?' * len(symbols))})",
+        connection,
+        params=(interval, start_time, *symbols)
+    )
+
+
+def open_response_cache_store(filename: str) -> sqlite3.Connection:
+    '''
+    open the SQLite response cache `{filename}.db`, creating its table if needed.
+    '''
+    log(LogLevel.INFO, f"Opening response cache: '{filename}.db'.")
+    connection = sqlite3.connect(f"{filename}.db", check_same_thread=False)
+    connection.executescript(RESPONSE_CACHE_SCHEMA)
+    return connection
+
+
+def read_cached_response(connection: sqlite3.Connection, key: str, now: float) -> Optional[Tuple[float, bytes]]:
+    '''
+    read the expiry time (in seconds since the epoch) and body of the response cached under `key`, or None when it is missing or expired.
+    '''
+    return connection.execute("SELECT expiresAt, body FROM responses WHERE key = ? AND expiresAt > ?", (key, now)).fetchone()
+
+
+def write_cached_response(
+    connection: sqlite3.Connection,
+    key: str,
+    expires_at: float,
+    body: bytes,
+    now: float,
+    max_entries: int
+) -> None:
+    '''
+    cache a response body under `key` until `expires_at`, then drop the responses expired by `now`
+    and the ones expiring first beyond `max_entries`.
+    '''
+    with connection:
+        connection.execute("INSERT OR REPLACE INTO responses (key, expiresAt, body) VALUES (?, ?, ?)", (key, expires_at, body))
+        connection.execute("DELETE FROM responses WHERE expiresAt <= ?", (now,))
+        connection.execute(
+            "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY expiresAt DESC LIMIT ?)", (max_entries,)
+        )
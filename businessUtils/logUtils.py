@@ -1,5 +1,9 @@
 from datetime import datetime
-from inspect import getframeinfo, stack
+from typing import Dict, IO, Optional
+import atexit
+import os
+import sys
+import threading
 
 class LogLevel:
     ERROR: str = "ERROR"
@@ -7,11 +11,88 @@ class LogLevel:
     TRACE: str = "TRACE"
 
 
+LOG_LEVEL_RANKS: Dict[str, int] = {
+    LogLevel.TRACE: 0,
+    LogLevel.INFO: 1,
+    LogLevel.ERROR: 2
+}
+LOG_DIR: str = "logs"
+LOG_BUFFER_SIZE: int = 64 * 1024
+MAX_LOG_ARG_LENGTH: int = 2000
+
+
+class _LogWriter(object):
+    '''
+    Keeps the hourly log file open behind one buffered handle, reopening it when the hour changes.
+    Buffered lines are flushed on errors and at exit.
+    '''
+    def __init__(self, log_dir: str, log_level: str):
+        self.log_dir: str = log_dir
+        self.level_rank: int = LOG_LEVEL_RANKS[log_level]
+        self._log_file: Optional[IO[str]] = None
+        self._log_file_name: Optional[str] = None
+        self._lock = threading.Lock()
+
+
+    def write(self, log_file_name: str, line: str, flush: bool=False) -> None:
+        with self._lock:
+            if log_file_name != self._log_file_name:
+                self._close()
+                os.makedirs(self.log_dir, exist_ok=True)
+                self._log_file = open(log_file_name, "a", buffering=LOG_BUFFER_SIZE)
+                self._log_file_name = log_file_name
+            self._log_file.write(line)
+            if flush:
+                self._log_file.flush()
+
+
+    def _close(self) -> None:
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+            self._log_file_name = None
+
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+
+_log_writer = _LogWriter(LOG_DIR, os.environ.get("LOG_LEVEL", LogLevel.INFO))
+atexit.register(_log_writer.close)
+
+
+def set_log_level(log_level: LogLevel) -> None:
+    '''
+    only log messages at `log_level` or above from now on.
+    '''
+    _log_writer.level_rank = LOG_LEVEL_RANKS[log_level]
+
+
+def is_log_enabled(log_level: LogLevel) -> bool:
+    '''
+    check if messages at `log_level` are logged, so callers can skip building expensive messages.
+    '''
+    return LOG_LEVEL_RANKS[log_level] >= _log_writer.level_rank
+
+
+def _truncate(arg: object) -> str:
+    message = str(arg)
+    if len(message) > MAX_LOG_ARG_LENGTH:
+        return f"{message[:MAX_LOG_ARG_LENGTH]}... ({len(message) - MAX_LOG_ARG_LENGTH} more characters)"
+    return message
+
+
 def log(log_level: LogLevel, *args):
-    log_dir: str = "logs"
-    caller = getframeinfo(stack()[1][0])
+    if not is_log_enabled(log_level):
+        return
+
+    caller = sys._getframe(1)
     datetime_object = datetime.now()
-    log_file_name = f"{log_dir}/crypto_log{datetime_object.isoformat(timespec='hours')}.txt"
-    with open(log_file_name, "a") as log_file:
-        print(f"{datetime_object} - {log_level} {caller.filename}:{caller.lineno} - ", *args, file=log_file)
- 
\ No newline at end of file
+    log_file_name = f"{_log_writer.log_dir}/crypto_log{datetime_object.isoformat(timespec='hours')}.txt"
+    message = " ".join(_truncate(arg) for arg in args)
+    _log_writer.write(
+        log_file_name,
+        f"{datetime_object} - {log_level} {caller.f_code.co_filename}:{caller.f_lineno} -  {message}\n",
+        flush=log_level == LogLevel.ERROR
+    )
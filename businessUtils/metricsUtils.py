@@ -0,0 +1,133 @@
+from businessUtils.errorUtils import RuntimeException
+from businessUtils.logUtils import LogLevel, log
+
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List
+import json
+import re
+import threading
+import time
+
+
+class Metrics(object):
+    '''
+    Thread safe metrics of a run: counters, gauges and timers (count, total and max seconds) by name.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at: float = time.time()
+            self.counters: Dict[str, float] = {}
+            self.gauges: Dict[str, float] = {}
+            self.timers: Dict[str, Dict[str, float]] = {}
+
+
+    def increment(self, name: str, value: float=1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timer = self.timers.setdefault(name, {"count": 0, "totalSeconds": 0.0, "maxSeconds": 0.0})
+            timer["count"] += 1
+            timer["totalSeconds"] += seconds
+            timer["maxSeconds"] = max(timer["maxSeconds"], seconds)
+
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        '''
+        time the body of a `with` block, including when it raises
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "startedAt": self.started_at,
+                "durationSeconds": time.time() - self.started_at,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "timers": {name: dict(timer) for name, timer in self.timers.items()}
+            }
+
+
+metrics = Metrics()
+
+
+def timed(name: str) -> Callable:
+    '''
+    decorator timing every call of a function under `name` in `metrics`
+    '''
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def func(*args, **kwargs):
+            with metrics.timer(name):
+                return function(*args, **kwargs)
+
+        return func
+
+    return decorator
+
+
+def _prometheus_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def format_prometheus_report(report: Dict[str, Any]) -> str:
+    '''
+    format a metrics report in the prometheus text exposition format
+    '''
+    lines: List[str] = [
+        "# TYPE portfolio_run_duration_seconds gauge",
+        f"portfolio_run_duration_seconds {report['durationSeconds']}"
+    ]
+    for name, value in sorted(report["counters"].items()):
+        lines += [f"# TYPE portfolio_{_prometheus_name(name)}_total counter", f"portfolio_{_prometheus_name(name)}_total {value}"]
+    for name, value in sorted(report["gauges"].items()):
+        lines += [f"# TYPE portfolio_{_prometheus_name(name)} gauge", f"portfolio_{_prometheus_name(name)} {value}"]
+
+    timer_lines: Dict[str, List[str]] = {"count": [], "totalSeconds": [], "maxSeconds": []}
+    for name, timer in sorted(report["timers"].items()):
+        for field in timer_lines:
+            timer_lines[field].append(f'{{name="{name}"}} {timer[field]}')
+    for field, metric_name in (("count", "portfolio_timer_calls_total"), ("totalSeconds", "portfolio_timer_seconds_total"), ("maxSeconds", "portfolio_timer_max_seconds")):
+        lines.append(f"# TYPE {metric_name} {'gauge' if field == 'maxSeconds' else 'counter'}")
+        lines += [metric_name + timer_line for timer_line in timer_lines[field]]
+
+    return "\n".join(lines) + "\n"
+
+
+def write_run_report(filename: str, report_format: str="json") -> None:
+    '''
+    write the metrics of this run to `{filename}.json`, or `{filename}.prom` for the "prometheus" format.
+    '''
+    report = metrics.report()
+    if report_format == "json":
+        report_filename = f"{filename}.json"
+        serialized_report = json.dumps(report, indent=4)
+    elif report_format == "prometheus":
+        report_filename = f"{filename}.prom"
+        serialized_report = format_prometheus_report(report)
+    else:
+        raise RuntimeException(f"Unknown run report format: '{report_format}'.")
+
+    log(LogLevel.INFO, f"Writing run report: '{report_filename}'.")
+    with open(report_filename, "w") as report_file:
+        report_file.write(serialized_report)
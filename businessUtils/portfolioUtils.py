@@ -1,10 +1,26 @@
-from businessUtils.fileIOUtils import read_from_json
+from businessUtils.fileIOUtils import SPOT_TRADE_FRAME_COLUMNS, SPOT_TRADE_FRAME_DECIMAL_COLUMNS, TICKER_AGGREGATE_FIELDS, read_from_json
 from businessUtils.errorUtils import RuntimeException
+from businessUtils.logUtils import LogLevel, log
+from businessUtils.metricsUtils import timed
 
-from typing import Dict, List, Union, Any, Set
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Any
 from datetime import datetime
 import time
 
+# numpy and pandas are only imported by the vectorized functions that use them, when first called
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+FEE_RATE = 0.001
+PORTFOLIO_COST_OFFSET = 345.85      # for USDT cost not included in usdt balance of the original account
+OPEN_ORDER_STATUSES = frozenset(("NEW", "PENDING_NEW", "PARTIALLY_FILLED"))
+CONSOLIDATED_SUMMARY_FIELDS = TICKER_AGGREGATE_FIELDS + ("actualValue", "totalQty", "totalValue")
+KLINE_INTERVALS: Dict[str, int] = {     # candle intervals aligned to the epoch, in milliseconds
+    "1h": 3_600_000,
+    "4h": 14_400_000,
+    "1d": 86_400_000
+}
 
 
 def _map_timestamp_to_datetime(trade_object: Dict[str, Any]) -> Dict[str, Any]:
@@ -17,6 +33,24 @@ def _map_timestamp_to_datetime(trade_object: Dict[str, Any]) -> Dict[str, Any]:
     return trade_object
 
 
+def _map_datetime_to_timestamp(trade_object: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    change the time fields in trade_object formatted by `_map_timestamp_to_datetime` back to timestamps in milliseconds
+    '''
+    for timefield in ("time", "updateTime"):
+        if isinstance(trade_object[timefield], str):
+            trade_object[timefield] = int(time.mktime(time.strptime(trade_object[timefield])) * 1000)
+
+    return trade_object
+
+
+def parse_trade_history(trade_history: List[Dict[str, Any]]) -> None:
+    '''
+    Convert datetime strings of a formatted trade_history back to timestamps
+    '''
+    list(map(_map_datetime_to_timestamp, trade_history))
+
+
 def format_trade_history(trade_history: List[Dict[str, Any]]) -> None:
     '''
     Convert timestamps to datetime object and sort trade_history object list
@@ -29,7 +63,7 @@ def resolve_spot_trade(spot_trade: Dict[str, Any]) -> Dict[str, Any]:
     '''
     resolve fields  for a buy or sell side spot trade.
     '''
-    fee_rate = 0.001
+    fee_rate = FEE_RATE
 
     if spot_trade["side"] == "BUY":
         spot_trade["actualQty"] = float(spot_trade["executedQty"]) * (1 - fee_rate)             # actual amount added to wallet
@@ -74,6 +108,169 @@ def create_ticker_summary(ticker: str, trades: List[Dict[str, Any]]) -> Dict[str
     }
 
 
+def fold_ticker_aggregates(ticker_aggregates: Dict[str, Dict[str, float]], spot_trades: List[Dict[str, Any]]) -> None:
+    '''
+    fold resolved spot trades into running per-symbol aggregates, summed the same way as `create_ticker_summary`.
+    '''
+    for trade in spot_trades:
+        aggregate = ticker_aggregates.setdefault(trade["symbol"], dict.fromkeys(TICKER_AGGREGATE_FIELDS, float(0)))
+        if trade["side"] == "BUY":
+            aggregate["origQty"] += float(trade['origQty'])
+            aggregate["actualQty"] += float(trade['actualQty'])
+            aggregate["totalCost"] += float(trade['totalCost'])
+            aggregate["actualCost"] += float(trade['actualCost'])
+        else:
+            aggregate["totalSaleQty"] += float(trade['origQty'])
+            aggregate["totalSaleValue"] += float(trade['actualCost'])
+
+
+def create_ticker_summary_from_aggregate(ticker: str, ticker_aggregate: Dict[str, float]) -> Dict[str, Any]:
+    '''
+    create a ticker summary from a ticker and its running aggregate.
+    '''
+    return {
+        "symbol": ticker,
+        "date": str(datetime.now()),
+        **{field: ticker_aggregate[field] for field in TICKER_AGGREGATE_FIELDS}
+    }
+
+
+@timed("pandas.create_spot_trade_frame")
+def create_spot_trade_frame(spot_order_history: List[Dict[str, Any]]) -> "pd.DataFrame":
+    '''
+    load the FILLED orders of a spot order history into a typed frame and resolve
+    the fields of `resolve_spot_trade` for all of them at once.
+    The frame index is the position of each order in `spot_order_history`.
+    '''
+    import pandas as pd
+
+    filled_positions = [position for position, order in enumerate(spot_order_history) if order["status"] == "FILLED"]
+    frame = pd.DataFrame(
+        {column: [spot_order_history[position][column] for position in filled_positions] for column in SPOT_TRADE_FRAME_COLUMNS},
+        index=filled_positions,
+        columns=list(SPOT_TRADE_FRAME_COLUMNS)
+    )
+    return resolve_spot_trade_frame(frame.astype({column: float for column in SPOT_TRADE_FRAME_DECIMAL_COLUMNS}))
+
+
+def resolve_spot_trade_frame(frame: "pd.DataFrame") -> "pd.DataFrame":
+    '''
+    resolve the fields of `resolve_spot_trade` for every trade of a frame holding the `SPOT_TRADE_FRAME_COLUMNS` as floats, in place.
+    '''
+    import numpy as np
+
+    is_buy = (frame["side"] == "BUY").to_numpy()
+    is_sell = (frame["side"] == "SELL").to_numpy()
+    if not (is_buy | is_sell).all():
+        raise RuntimeException("Unknown trade side. Neither 'BUY' nor 'SELL'.")
+
+    executed_qty = frame["executedQty"].to_numpy()
+    quote_qty = frame["cummulativeQuoteQty"].to_numpy()
+    frame["actualQty"] = np.where(is_buy, executed_qty * (1 - FEE_RATE), executed_qty)
+    frame["fee"] = np.where(is_buy, executed_qty * FEE_RATE, quote_qty * FEE_RATE)
+    frame["actualCost"] = np.where(is_buy, quote_qty, quote_qty * (1 - FEE_RATE))
+    frame["totalCost"] = quote_qty
+
+    return frame
+
+
+@timed("pandas.fold_ticker_aggregate_frame")
+def fold_ticker_aggregate_frame(ticker_aggregates: Dict[str, Dict[str, float]], spot_trade_frame: "pd.DataFrame") -> None:
+    '''
+    fold the resolved trades of `spot_trade_frame` into running per-symbol aggregates, like `fold_ticker_aggregates`
+    does one trade at a time. Sums are accumulated in trade order onto the running aggregates, so they match it exactly.
+    '''
+    import numpy as np
+    import pandas as pd
+
+    symbol_codes, symbols = pd.factorize(spot_trade_frame["symbol"])
+    trade_order = np.argsort(symbol_codes, kind="stable")
+    symbol_bounds = np.searchsorted(symbol_codes[trade_order], np.arange(len(symbols) + 1))
+
+    is_buy = (spot_trade_frame["side"] == "BUY").to_numpy()
+    orig_qty = spot_trade_frame["origQty"].to_numpy()
+    actual_cost = spot_trade_frame["actualCost"].to_numpy()
+    summed_columns = {
+        "origQty": np.where(is_buy, orig_qty, 0.0),
+        "actualQty": np.where(is_buy, spot_trade_frame["actualQty"].to_numpy(), 0.0),
+        "totalCost": np.where(is_buy, spot_trade_frame["totalCost"].to_numpy(), 0.0),
+        "actualCost": np.where(is_buy, actual_cost, 0.0),
+        "totalSaleQty": np.where(is_buy, 0.0, orig_qty),
+        "totalSaleValue": np.where(is_buy, 0.0, actual_cost)
+    }
+    summed_columns = {name: values[trade_order] for name, values in summed_columns.items()}
+
+    for symbol, start, end in zip(symbols, symbol_bounds[:-1], symbol_bounds[1:]):
+        aggregate = ticker_aggregates.setdefault(symbol, dict.fromkeys(TICKER_AGGREGATE_FIELDS, float(0)))
+        for name, values in summed_columns.items():
+            aggregate[name] = float(np.add.accumulate(np.r_[aggregate[name], values[start:end]])[-1])
+
+
+@timed("pandas.create_fill_summaries")
+def create_fill_summaries(
+    fills: "pd.DataFrame",
+    quote_currencies: Tuple[str, ...],
+    commission_prices: Dict[str, float]
+) -> List[Dict[str, Any]]:
+    '''
+    create the ticker summary of every symbol in the `fills` frame of `read_fills`, from the commission actually paid
+    on each fill rather than `FEE_RATE`. Commissions in the base asset come off the quantity bought or sold, the
+    rest are valued in the quote currency, taking commissions in any other asset (e.g. BNB) at `commission_prices`.
+    Besides the fields of `create_ticker_summary`, every summary holds the fees paid and the average cost basis of the holding.
+    '''
+    import numpy as np
+    import pandas as pd
+
+    if fills.empty:
+        return []
+
+    symbols = fills["symbol"].to_numpy()
+    base_assets = fills["symbol"].map({
+        symbol: symbol[:-len(quote_currency)]
+        for symbol in set(symbols) for quote_currency in quote_currencies if symbol.endswith(quote_currency)
+    }).to_numpy()
+    commission_assets = fills["commissionAsset"].to_numpy()
+    is_base_commission = commission_assets == base_assets
+    is_quote_commission = ~is_base_commission & np.isin(commission_assets, quote_currencies)
+
+    missing_assets = set(commission_assets[~is_base_commission & ~is_quote_commission]) - set(commission_prices)
+    if missing_assets:
+        log(LogLevel.ERROR, f"No price for commission assets: {missing_assets}. Their commissions are left out of the fees.")
+    commission_asset_prices = pd.Series(commission_assets).map(commission_prices).fillna(0.0).to_numpy()
+
+    is_buy = fills["isBuyer"].to_numpy().astype(bool)
+    price = fills["price"].to_numpy()
+    qty = fills["qty"].to_numpy()
+    quote_qty = fills["quoteQty"].to_numpy()
+    commission = fills["commission"].to_numpy()
+    base_commission = np.where(is_base_commission, commission, 0.0)
+    quote_commission = np.where(is_base_commission, 0.0, np.where(is_quote_commission, commission, commission * commission_asset_prices))
+
+    summed_columns = {
+        "origQty": np.where(is_buy, qty, 0.0),
+        "actualQty": np.where(is_buy, qty - base_commission, 0.0),
+        "totalCost": np.where(is_buy, quote_qty + quote_commission, 0.0),
+        "totalSaleQty": np.where(is_buy, 0.0, qty + base_commission),
+        "totalSaleValue": np.where(is_buy, 0.0, quote_qty - quote_commission),
+        "fees": np.where(is_base_commission, commission * price, quote_commission)
+    }
+    # fills are sorted by symbol, so every symbol is one contiguous run
+    symbol_starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]])
+    summed_columns = {name: np.add.reduceat(values, symbol_starts) for name, values in summed_columns.items()}
+
+    fill_summaries: List[Dict[str, Any]] = []
+    for position, base_asset in enumerate(base_assets[symbol_starts]):
+        fill_summary: Dict[str, Any] = {"symbol": base_asset, "date": str(datetime.now())}
+        for name, values in summed_columns.items():
+            fill_summary[name] = float(values[position])
+        fill_summary["actualCost"] = fill_summary["totalCost"]
+        fill_summary["averageCost"] = fill_summary["totalCost"] / (fill_summary["actualQty"] or 1.0)
+        fill_summary["costBasis"] = fill_summary["averageCost"] * (fill_summary["actualQty"] - fill_summary["totalSaleQty"])
+        fill_summaries.append(fill_summary)
+
+    return fill_summaries
+
+
 def resolve_spot_balance(spot_balance: List[Dict[str, Any]], ticker_prices: Dict[str, Dict[str, str]]) -> List[Dict[str, Any]]:
     '''
     resolve spot coin balances with their prices
@@ -98,12 +295,240 @@ def resolve_spot_balance(spot_balance: List[Dict[str, Any]], ticker_prices: Dict
     ]
 
 
-def reduce_trade_history(trade_history: List[Dict[str, Any]], new_trade_history: List[Dict[str, Any]]) -> None:
+def find_balances_to_reprice(
+    balances: List[Dict[str, str]],
+    previous_spot_balance: Dict[str, Dict[str, Any]],
+    material_value: float
+) -> List[Dict[str, str]]:
+    '''
+    find the raw snapshot `balances` that are new, whose free or locked quantity changed since the resolved
+    `previous_spot_balance`, or that were worth at least `material_value` then.
+    '''
+    return [
+        balance for balance in balances
+        if balance["asset"] not in previous_spot_balance
+        or previous_spot_balance[balance["asset"]]["balanceQty"] != balance["free"]
+        or previous_spot_balance[balance["asset"]]["locked"] != balance["locked"]
+        or previous_spot_balance[balance["asset"]]["actualValue"] >= material_value
+    ]
+
+
+def map_execution_report_to_order(execution_report: Dict[str, Any]) -> Dict[str, Any]:
     '''
-    reduce the new trade history objects into the new trade history without duplicates
+    map a user data stream `executionReport` event to an order shaped like the ones returned by allOrders.
     '''
-    cached_trade_history: Set[int] = set(trade["orderId"] for trade in trade_history)
-    trade_history.extend(trade for trade in new_trade_history if trade["orderId"] not in cached_trade_history)
+    return {
+        "symbol": execution_report["s"],
+        "orderId": execution_report["i"],
+        "orderListId": execution_report["g"],
+        "clientOrderId": execution_report["c"],
+        "price": execution_report["p"],
+        "origQty": execution_report["q"],
+        "executedQty": execution_report["z"],
+        "cummulativeQuoteQty": execution_report["Z"],
+        "status": execution_report["X"],
+        "timeInForce": execution_report["f"],
+        "type": execution_report["o"],
+        "side": execution_report["S"],
+        "stopPrice": execution_report["P"],
+        "icebergQty": execution_report["F"],
+        "time": execution_report["O"],
+        "updateTime": execution_report["T"],
+        "isWorking": execution_report["w"],
+        "origQuoteOrderQty": execution_report["Q"]
+    }
+
+
+def resolve_ticker_price(
+    ticker: str,
+    ticker_prices: Dict[str, Dict[str, str]],
+    quote_currencies: Tuple[str, ...],
+    conversion_currencies: Tuple[str, ...]=()
+) -> Dict[str, str]:
+    '''
+    get the price info of `ticker` from a snapshot of `ticker_prices` keyed by symbol,
+    trying each of the `quote_currencies` in order. A ticker quoted in none of them is priced
+    through the first of the `conversion_currencies` it is quoted in, e.g. XYZBTC x BTCUSDT,
+    and its price info names the conversion pair as "quoteSymbol".
+    '''
+    for quote_currency in quote_currencies:
+        ticker_price = ticker_prices.get(ticker + quote_currency)
+        if ticker_price is not None:
+            return ticker_price
+
+    for conversion_currency in conversion_currencies:
+        conversion_ticker_price = ticker_prices.get(ticker + conversion_currency)
+        if conversion_ticker_price is None:
+            continue
+        for quote_currency in quote_currencies:
+            quote_ticker_price = ticker_prices.get(conversion_currency + quote_currency)
+            if quote_ticker_price is not None:
+                return {
+                    "symbol": conversion_ticker_price["symbol"],
+                    "price": str(float(conversion_ticker_price["price"]) * float(quote_ticker_price["price"])),
+                    "quoteSymbol": quote_ticker_price["symbol"]
+                }
+
+    raise RuntimeException(f"No ticker price for '{ticker}' quoted in any of: {quote_currencies + conversion_currencies}.")
+
+
+def create_symbol_index(exchange_info: Dict[str, Any]) -> Dict[str, Dict[str, Dict[str, str]]]:
+    '''
+    index the symbols of an exchangeInfo payload by base asset, then quote asset
+    '''
+    symbol_index: Dict[str, Dict[str, Dict[str, str]]] = {}
+    for symbol_info in exchange_info["symbols"]:
+        symbol_index.setdefault(symbol_info["baseAsset"], {})[symbol_info["quoteAsset"]] = {
+            "symbol": symbol_info["symbol"],
+            "status": symbol_info["status"]
+        }
+
+    return symbol_index
+
+
+def find_symbol(symbol_index: Dict[str, Dict[str, Dict[str, str]]], ticker: str, quote_currencies: Tuple[str, ...]) -> Optional[str]:
+    '''
+    find the symbol pairing `ticker` with the first of the `quote_currencies` it is listed against, whatever its
+    trading status, since halted and delisted pairs keep their order history. None when there is no such pair.
+    '''
+    ticker_symbols = symbol_index.get(ticker, {})
+    for quote_currency in quote_currencies:
+        if quote_currency in ticker_symbols:
+            return ticker_symbols[quote_currency]["symbol"]
+
+    return None
+
+
+def reduce_trade_history(
+    trade_history: List[Dict[str, Any]],
+    new_trade_history: List[Dict[str, Any]],
+    order_index: Optional[Dict[Tuple[str, int], int]]=None
+) -> Dict[Tuple[str, int], int]:
+    '''
+    upsert the new trade history objects into the trade history by (symbol, orderId): orders seen before
+    are replaced in place, e.g. when a NEW order has since FILLED, and unseen orders are appended.
+    Returns the index of positions by (symbol, orderId), which can be passed back in to reuse it.
+    '''
+    if order_index is None:
+        order_index = {(trade["symbol"], trade["orderId"]): position for position, trade in enumerate(trade_history)}
+
+    for trade in new_trade_history:
+        order_key = (trade["symbol"], trade["orderId"])
+        position = order_index.get(order_key)
+        if position is None:
+            order_index[order_key] = len(trade_history)
+            trade_history.append(trade)
+        else:
+            trade_history[position] = trade
+
+    return order_index
+
+
+def update_order_cursor(order_cursors: Dict[str, Dict[str, int]], symbol: str, orders: List[Dict[str, Any]]) -> None:
+    '''
+    move the sync cursor of `symbol` to the latest order (by orderId) in the raw `orders` fetched from binance,
+    or to just before the oldest order still open, so the next sync fetches that order again until it is final.
+    '''
+    if not orders:
+        return
+
+    latest_order = max(orders, key=lambda order: order["orderId"])
+    open_order_ids = [order["orderId"] for order in orders if order["status"] in OPEN_ORDER_STATUSES]
+    order_cursors[symbol] = {
+        "orderId": min(open_order_ids) - 1 if open_order_ids else latest_order["orderId"],
+        "updateTime": latest_order["updateTime"]
+    }
+
+
+def find_missing_kline_ranges(
+    cached_range: Optional[Tuple[int, int]],
+    start_time: int,
+    end_time: int,
+    interval_milliseconds: int
+) -> List[Tuple[int, int]]:
+    '''
+    find the open time ranges of the candles between `start_time` and `end_time` missing from a cache holding
+    the candles in `cached_range`. The last cached candle is fetched again, since it may have been open when cached.
+    '''
+    start_time = start_time // interval_milliseconds * interval_milliseconds
+    if cached_range is None:
+        return [(start_time, end_time)]
+
+    first_open_time, last_open_time = cached_range
+    missing_ranges: List[Tuple[int, int]] = []
+    if start_time < first_open_time:
+        missing_ranges.append((start_time, first_open_time - 1))
+    missing_ranges.append((last_open_time, end_time))
+
+    return missing_ranges
+
+
+@timed("pandas.create_pnl_history")
+def create_pnl_history(
+    filled_orders: List[Dict[str, Any]],
+    kline_closes: "pd.DataFrame",
+    interval_milliseconds: int,
+    end_time: int
+) -> "pd.DataFrame":
+    '''
+    rebuild the position of every symbol at the close of each candle from its raw FILLED orders (timestamps in milliseconds)
+    and value the positions at the candle closes in `kline_closes`, as one position x price matrix product.
+    The frame is indexed by candle open time and holds the value of each symbol, "totalValue",
+    "netInvested" (quote spent on buys less quote received from sells) and "pnl".
+    '''
+    import numpy as np
+    import pandas as pd
+
+    spot_trade_frame = create_spot_trade_frame(filled_orders)
+    if spot_trade_frame.empty:
+        return pd.DataFrame(columns=["totalValue", "netInvested", "pnl"])
+
+    order_times = np.array([filled_orders[position]["time"] for position in spot_trade_frame.index], dtype=np.int64)
+    open_times = np.arange(
+        order_times.min() // interval_milliseconds * interval_milliseconds,
+        end_time // interval_milliseconds * interval_milliseconds + 1,
+        interval_milliseconds
+    )
+    candle_rows = np.searchsorted(open_times, order_times // interval_milliseconds * interval_milliseconds)
+    symbol_codes, symbols = pd.factorize(spot_trade_frame["symbol"])
+
+    is_buy = (spot_trade_frame["side"] == "BUY").to_numpy()
+    position_changes = np.zeros((len(open_times), len(symbols)))
+    np.add.at(
+        position_changes,
+        (candle_rows, symbol_codes),
+        np.where(is_buy, spot_trade_frame["actualQty"].to_numpy(), -spot_trade_frame["actualQty"].to_numpy())
+    )
+    cash_flows = np.bincount(
+        candle_rows,
+        weights=np.where(is_buy, spot_trade_frame["totalCost"].to_numpy(), -spot_trade_frame["actualCost"].to_numpy()),
+        minlength=len(open_times)
+    )
+
+    # candles missing from the cache take the last known close, symbols without any are valued at 0
+    closes = (
+        kline_closes.pivot(index="openTime", columns="symbol", values="close")
+        .reindex(columns=symbols)
+        .reindex(index=open_times, method="ffill")
+        .fillna(0.0)
+        .to_numpy()
+    )
+    values = np.cumsum(position_changes, axis=0) * closes
+
+    pnl_history = pd.DataFrame(values, index=pd.Index(open_times, name="openTime"), columns=list(symbols))
+    pnl_history["totalValue"] = values.sum(axis=1)
+    pnl_history["netInvested"] = np.cumsum(cash_flows)
+    pnl_history["pnl"] = pnl_history["totalValue"] - pnl_history["netInvested"]
+
+    return pnl_history
+
+
+def resolve_pnl_history(pnl_history: "pd.DataFrame") -> List[Dict[str, Any]]:
+    '''
+    resolve the rows of a pnl history frame into records dated by their candle open time in UTC
+    '''
+    dates = [time.strftime("%Y-%m-%d %H:%M", time.gmtime(open_time / 1000)) for open_time in pnl_history.index.tolist()]
+    return [{"date": date, **row} for date, row in zip(dates, pnl_history.to_dict("records"))]
 
 
 def resolve_portfolio_summary_old(portfolio_summary: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -145,7 +570,11 @@ def resolve_portfolio_summary_old(portfolio_summary: List[Dict[str, Any]]) -> Li
 
     return portfolio_summary
 
-def resolve_portfolio_summary(portfolio_summary: List[Dict[str, Any]], spot_balance: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+def resolve_portfolio_summary(
+    portfolio_summary: List[Dict[str, Any]],
+    spot_balance: Dict[str, Dict[str, Any]],
+    portfolio_cost_offset: float=0.0
+) -> List[Dict[str, Any]]:
     '''
     resolve the objects in portfolio summary
     and sort by most profitable.
@@ -170,12 +599,11 @@ def resolve_portfolio_summary(portfolio_summary: List[Dict[str, Any]], spot_bala
     , key=lambda x: float(x["pnl%"][:-1]), reverse=True)
     
     portfolio_cost = portfolio_value = 0.0
-    portfolio_cost_offset = 345.85 # for USDT cost not included in usdt balance
     for coin in portfolio_summary:
         portfolio_cost += coin["totalCost"]
         portfolio_value += coin.get("actualValue", 0.0)
 
-    portfolio_value += spot_balance["USDT"]["actualValue"]
+    portfolio_value += spot_balance.get("USDT", {"actualValue": 0})["actualValue"]
     portfolio_cost -= portfolio_cost_offset
     
     portfolio_summary.append(
@@ -183,8 +611,50 @@ def resolve_portfolio_summary(portfolio_summary: List[Dict[str, Any]], spot_bala
             "portfolioCost": portfolio_cost,
             "portfolioValue": portfolio_value,
             "portfolioPNL": portfolio_value - portfolio_cost,
-            "portfolioPNL%": "{:.2f}".format((portfolio_value - portfolio_cost) / portfolio_cost * 100) + "%"
+            "portfolioPNL%": "{:.2f}".format((portfolio_value - portfolio_cost) / (portfolio_cost or 1.0) * 100) + "%"
+        }
+    )
+
+    return portfolio_summary
+
+
+def consolidate_portfolio_summaries(account_summaries: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    '''
+    consolidate the resolved portfolio summaries of several accounts, keyed by account name, into one:
+    coins held in several accounts are summed, then sorted by most profitable like `resolve_portfolio_summary`.
+    '''
+    coin_summaries: Dict[str, Dict[str, Any]] = {}
+    portfolio_cost = portfolio_value = 0.0
+    for account, portfolio_summary in account_summaries.items():
+        *summaries, portfolio_total = portfolio_summary
+        portfolio_cost += portfolio_total["portfolioCost"]
+        portfolio_value += portfolio_total["portfolioValue"]
+
+        for summary in summaries:
+            coin_summary = coin_summaries.setdefault(
+                summary["symbol"],
+                {"symbol": summary["symbol"], "accounts": [], **dict.fromkeys(CONSOLIDATED_SUMMARY_FIELDS, float(0))}
+            )
+            coin_summary["accounts"].append(account)
+            for field in CONSOLIDATED_SUMMARY_FIELDS:
+                coin_summary[field] += float(summary.get(field, 0.0))
+
+    consolidated_summary = sorted((
+        {
+            **summary,
+            "pnl": summary["totalValue"] - summary["totalCost"],
+            "pnl%": "{:.2f}".format((summary["totalValue"] - summary["totalCost"])/(summary["totalCost"] or 1.0) * 100) + "%"
+        }
+        for summary in coin_summaries.values()
+    ), key=lambda x: float(x["pnl%"][:-1]), reverse=True)
+
+    consolidated_summary.append(
+        {
+            "portfolioCost": portfolio_cost,
+            "portfolioValue": portfolio_value,
+            "portfolioPNL": portfolio_value - portfolio_cost,
+            "portfolioPNL%": "{:.2f}".format((portfolio_value - portfolio_cost) / (portfolio_cost or 1.0) * 100) + "%"
         }
     )
 
-    return portfolio_summary
\ No newline at end of file
+    return consolidated_summary
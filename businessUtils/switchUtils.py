@@ -5,7 +5,20 @@ from typing import Dict
 class Switch:
     switches: Dict[str, bool] = {
         "use_refactored_code": True,
-        "use_new_date_format_for_balance": True
+        "use_new_date_format_for_balance": True,
+        "use_order_store": True,
+        "export_spot_order_history": False,
+        # folds the new trades of the incremental portfolio summary from columnar order store reads
+        "use_vectorized_trade_engine": True,
+        "use_incremental_portfolio_summary": True,
+        "run_portfolio_daemon": False,
+        "export_pnl_history": False,
+        "run_all_accounts": False,
+        "use_symbol_index": True,
+        "use_trade_fills": False,
+        "persist_response_cache": False,
+        "diff_spot_balance": False,
+        "export_parquet": False
     }
 
     def __init__(self) -> None:
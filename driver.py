@@ -1,14 +1,30 @@
 from businessLogic import portfolio
 from businessUtils.switchUtils import Switch
 from businessUtils.logUtils import LogLevel, log
+from businessUtils.metricsUtils import write_run_report
+from businessUtils.portfolioUtils import PORTFOLIO_COST_OFFSET
 from businessLogic.portfolio import Portfolio
 
+from dotenv import load_dotenv
+
 
 if __name__ == '__main__':
+    load_dotenv()
     try:
-        if Switch.check_switch("use_refactored_code"):
+        if Switch.check_switch("run_all_accounts"):
+            from businessLogic.accounts import AccountRunner, load_accounts
+
+            log(LogLevel.INFO, "Starting Driver... Invoking AccountRunner instance...")
+            AccountRunner(load_accounts()).run()
+        elif Switch.check_switch("run_portfolio_daemon"):
+            from businessLogic.daemon import PortfolioDaemon
+            import asyncio
+
+            log(LogLevel.INFO, "Starting Driver... Invoking Portfolio daemon...")
+            asyncio.run(PortfolioDaemon(Portfolio(portfolio_cost_offset=PORTFOLIO_COST_OFFSET)).run())
+        elif Switch.check_switch("use_refactored_code"):
             log(LogLevel.INFO, "Starting Driver... Invoking Portfolio instance...")
-            portfolio = Portfolio()
+            portfolio = Portfolio(portfolio_cost_offset=PORTFOLIO_COST_OFFSET)
             portfolio.update()
             log(LogLevel.INFO, "Driver destroyed. Exiting ...")
         else:
@@ -35,4 +51,6 @@ if __name__ == '__main__':
     except Exception as e:
         log(LogLevel.ERROR, str(e))
         raise e
+    finally:
+        write_run_report("run_report")
     
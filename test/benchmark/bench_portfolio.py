@@ -0,0 +1,134 @@
+'''
+Benchmark each stage of `Portfolio.update` against synthetic binance payloads.
+
+    python -m test.benchmark.bench_portfolio --coins 100 --orders 500 --output bench_output.json
+
+Exports are written in the background while the next stages run, so `_flush_exports` times
+what is left of them once the last stage is done. Every stage is timed on a first run, which syncs the whole history, and on an incremental run
+with no new orders, which is what a cron run usually looks like. Peak memory is measured on a
+separate pass, so tracemalloc overhead does not distort the timings.
+'''
+from businessLogic.portfolio import Portfolio
+from businessUtils.fileIOUtils import write_to_json
+from test.benchmark.fixtures import OfflineBinance
+
+from typing import Dict, List, Any
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+STAGES = (
+    "_write_spot_balance",
+    "_write_spot_order_history",
+    "_write_refined_spot_trades",
+    "_write_portfolio_summary",
+    "_flush_exports"
+)
+RUNS = ("initial", "incremental")
+
+
+def _run_stages(portfolio: Portfolio, trace_memory: bool) -> Dict[str, Dict[str, float]]:
+    '''
+    run every stage of `portfolio.update` in order, measuring wall time or peak memory of each
+    '''
+    stage_results: Dict[str, Dict[str, float]] = {}
+    for stage in STAGES:
+        if trace_memory:
+            tracemalloc.start()
+            getattr(portfolio, stage)()
+            stage_results[stage] = {"peakMemoryMB": tracemalloc.get_traced_memory()[1] / 2 ** 20}
+            tracemalloc.stop()
+        else:
+            start = time.perf_counter()
+            getattr(portfolio, stage)()
+            stage_results[stage] = {"seconds": time.perf_counter() - start}
+
+    return stage_results
+
+
+def _run_portfolio(coin_count: int, orders_per_coin: int, trace_memory: bool) -> Dict[str, Dict[str, Dict[str, float]]]:
+    '''
+    run the initial and incremental portfolio updates in a scratch directory
+    '''
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as output_dir:
+        os.chdir(output_dir)
+        try:
+            binance = OfflineBinance(coin_count, orders_per_coin)
+            write_to_json(binance.coins, "spot_tickers")
+            write_to_json([], "spot_order_history")
+
+            run_results: Dict[str, Dict[str, Dict[str, float]]] = {}
+            for run in RUNS:
+                binance.request_count = 0
+                run_results[run] = _run_stages(Portfolio(binance=binance), trace_memory)
+                run_results[run]["requests"] = {"count": binance.request_count}
+            return run_results
+        finally:
+            os.chdir(cwd)
+
+
+def run_benchmark(coin_count: int, orders_per_coin: int, trace_memory: bool=True) -> Dict[str, Any]:
+    '''
+    benchmark `Portfolio.update` for `coin_count` coins with `orders_per_coin` orders each.
+    Returns seconds, throughput (items per second) and peak memory of every stage, per run.
+    '''
+    stage_items = {
+        "_write_spot_balance": coin_count,
+        "_write_spot_order_history": coin_count * orders_per_coin,
+        "_write_refined_spot_trades": coin_count * orders_per_coin,
+        "_write_portfolio_summary": coin_count,
+        "_flush_exports": coin_count * orders_per_coin
+    }
+    results: Dict[str, Any] = {"coins": coin_count, "ordersPerCoin": orders_per_coin}
+    timings = _run_portfolio(coin_count, orders_per_coin, trace_memory=False)
+    memory = _run_portfolio(coin_count, orders_per_coin, trace_memory=True) if trace_memory else {}
+
+    for run in RUNS:
+        results[run] = {"requests": timings[run]["requests"]["count"]}
+        for stage in STAGES:
+            seconds = timings[run][stage]["seconds"]
+            results[run][stage] = {
+                "seconds": seconds,
+                "itemsPerSecond": stage_items[stage] / seconds if seconds else float("inf"),
+                **memory.get(run, {}).get(stage, {})
+            }
+
+    return results
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    '''
+    format benchmark results as a plain text table
+    '''
+    lines: List[str] = [f"coins={results['coins']} ordersPerCoin={results['ordersPerCoin']}"]
+    for run in RUNS:
+        lines.append(f"{run} run ({results[run]['requests']} requests):")
+        for stage in STAGES:
+            stage_result = results[run][stage]
+            peak_memory = stage_result.get("peakMemoryMB")
+            lines.append(
+                f"  {stage:<28} {stage_result['seconds']:>9.4f}s {stage_result['itemsPerSecond']:>14.1f} items/s"
+                + (f" {peak_memory:>9.2f} MB peak" if peak_memory is not None else "")
+            )
+
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark Portfolio.update against synthetic binance payloads.")
+    parser.add_argument("--coins", type=int, default=100)
+    parser.add_argument("--orders", type=int, default=200, help="orders per coin")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory pass")
+    parser.add_argument("--output", help="also write the results to this json file")
+    arguments = parser.parse_args()
+
+    benchmark_results = run_benchmark(arguments.coins, arguments.orders, trace_memory=not arguments.no_memory)
+    print(format_results(benchmark_results))
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(benchmark_results, output_file, indent=4)
@@ -0,0 +1,102 @@
+'''
+Benchmark the startup cost of the driver: interpreter start and imports, without running an update.
+
+    python -m test.benchmark.bench_startup --runs 5 --output bench_startup.json
+
+Each run imports `driver` in a fresh interpreter under `python -X importtime`, which is what
+`python -X importtime driver.py` costs before the first request is sent. The heaviest imports
+are listed by cumulative time, and the heavy optional modules found loaded are flagged.
+'''
+from typing import Dict, List, Any
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "pyarrow", "websockets")
+
+
+def _parse_import_times(importtime_output: str) -> Dict[str, int]:
+    '''
+    parse the `-X importtime` report into the cumulative import time of every module, in microseconds
+    '''
+    import_times: Dict[str, int] = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        import_times[module.strip()] = int(cumulative)
+
+    return import_times
+
+
+def _run_startup(module: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPOSITORY_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return {"wallSeconds": time.perf_counter() - start, "importTimes": _parse_import_times(process.stderr)}
+
+
+def run_benchmark(runs: int=5, module: str="driver", top: int=10) -> Dict[str, Any]:
+    '''
+    import `module` in `runs` fresh interpreters. Returns the median wall and import seconds,
+    the `top` heaviest imports by median cumulative seconds and the heavy modules that got imported.
+    '''
+    startups = [_run_startup(module) for _ in range(runs)]
+    median_import_seconds = {
+        name: statistics.median(startup["importTimes"].get(name, 0) for startup in startups) / 1e6
+        for name in startups[0]["importTimes"]
+    }
+    heaviest_imports = sorted(
+        (name for name in median_import_seconds if name != module),
+        key=median_import_seconds.get,
+        reverse=True
+    )[:top]
+
+    return {
+        "module": module,
+        "runs": runs,
+        "wallSeconds": statistics.median(startup["wallSeconds"] for startup in startups),
+        "importSeconds": median_import_seconds[module],
+        "heaviestImports": {name: median_import_seconds[name] for name in heaviest_imports},
+        "heavyModulesImported": [name for name in HEAVY_MODULES if name in median_import_seconds]
+    }
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    '''
+    format benchmark results as a plain text table
+    '''
+    lines: List[str] = [
+        f"import {results['module']} ({results['runs']} runs): {results['wallSeconds']:.4f}s wall, {results['importSeconds']:.4f}s importing",
+        f"heavy modules imported: {', '.join(results['heavyModulesImported']) or 'none'}",
+        "heaviest imports:"
+    ]
+    for name, seconds in results["heaviestImports"].items():
+        lines.append(f"  {name:<40} {seconds:>9.4f}s")
+
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the driver.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="driver")
+    parser.add_argument("--output", help="also write the results to this json file")
+    arguments = parser.parse_args()
+
+    benchmark_results = run_benchmark(arguments.runs, arguments.module)
+    print(format_results(benchmark_results))
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(benchmark_results, output_file, indent=4)
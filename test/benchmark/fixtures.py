@@ -0,0 +1,262 @@
+from businessApi.client import Client
+from businessUtils.apiUtils import INVALID_SYMBOL_ERROR_CODE, timestamp
+from businessUtils.errorUtils import ClientException
+from businessUtils.portfolioUtils import KLINE_INTERVALS
+
+from typing import Dict, List, Optional, Any
+import random
+import threading
+
+
+BASE_TIME = 1609459200000       # 2021-01-01 in milliseconds
+BUSD_ONLY_EVERY = 10            # every n-th coin is only listed against BUSD
+BNB_PRICE = 500.0
+
+
+def generate_coins(coin_count: int) -> List[str]:
+    '''
+    generate `coin_count` synthetic coin names.
+    '''
+    return [f"C{index:04d}" for index in range(coin_count)]
+
+
+def quote_currency(coin_index: int) -> str:
+    return "BUSD" if coin_index % BUSD_ONLY_EVERY == BUSD_ONLY_EVERY - 1 else "USDT"
+
+
+def quote_currency_of(symbol: str) -> str:
+    return "BUSD" if symbol.endswith("BUSD") else "USDT"
+
+
+def generate_all_orders(symbol: str, order_count: int, seed: int=0) -> List[Dict[str, Any]]:
+    '''
+    generate an allOrders payload of `order_count` orders for `symbol`, sorted by orderId.
+    '''
+    random_generator = random.Random(f"{symbol}-{seed}")
+    orders: List[Dict[str, Any]] = []
+    order_time = BASE_TIME
+    for order_id in range(1, order_count + 1):
+        order_time += random_generator.randint(60_000, 86_400_000)
+        price = random_generator.uniform(0.01, 5000)
+        orig_qty = random_generator.uniform(0.001, 100)
+        status = random_generator.choices(("FILLED", "CANCELED", "EXPIRED"), weights=(8, 1, 1))[0]
+        executed_qty = orig_qty if status == "FILLED" else 0.0
+        orders.append({
+            "symbol": symbol,
+            "orderId": order_id,
+            "orderListId": -1,
+            "clientOrderId": f"synthetic{order_id}",
+            "price": "{:.8f}".format(price),
+            "origQty": "{:.8f}".format(orig_qty),
+            "executedQty": "{:.8f}".format(executed_qty),
+            "cummulativeQuoteQty": "{:.8f}".format(executed_qty * price),
+            "status": status,
+            "timeInForce": "GTC",
+            "type": "LIMIT",
+            "side": random_generator.choice(("BUY", "SELL")),
+            "stopPrice": "0.00000000",
+            "icebergQty": "0.00000000",
+            "time": order_time,
+            "updateTime": order_time + random_generator.randint(0, 60_000),
+            "isWorking": True,
+            "origQuoteOrderQty": "0.00000000"
+        })
+
+    return orders
+
+
+def generate_account_snapshot(coins: List[str], seed: int=0) -> Dict[str, Any]:
+    '''
+    generate an accountSnapshot payload holding a balance of every coin and USDT.
+    '''
+    random_generator = random.Random(seed)
+    balances = [
+        {"asset": coin, "free": "{:.8f}".format(random_generator.uniform(0, 100)), "locked": "0.00000000"}
+        for coin in coins
+    ]
+    balances.append({"asset": "USDT", "free": "{:.8f}".format(random_generator.uniform(0, 10000)), "locked": "0.00000000"})
+
+    return {
+        "code": 200,
+        "msg": "",
+        "snapshotVos": [{"type": "spot", "updateTime": BASE_TIME, "data": {"totalAssetOfBtc": "0", "balances": balances}}]
+    }
+
+
+def generate_kline(symbol: str, open_time: int, interval_milliseconds: int) -> List[Any]:
+    '''
+    generate the candle of `symbol` opened at `open_time`, the same on every call.
+    '''
+    close = "{:.8f}".format(random.Random(f"{symbol}-{open_time}").uniform(0.01, 5000))
+    return [open_time, close, close, close, close, "0.00000000", open_time + interval_milliseconds - 1, "0.00000000", 0, "0.00000000", "0.00000000", "0"]
+
+
+def generate_fill(order: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    generate the single myTrades fill of a FILLED `order`. Commissions are 0.1% of what was received,
+    except on every third order, which pays 0.075% in BNB valued at `BNB_PRICE`.
+    '''
+    is_buyer = order["side"] == "BUY"
+    if order["orderId"] % 3 == 0:
+        commission, commission_asset = float(order["cummulativeQuoteQty"]) * 0.00075 / BNB_PRICE, "BNB"
+    elif is_buyer:
+        commission, commission_asset = float(order["executedQty"]) * 0.001, order["symbol"][:-len(quote_currency_of(order["symbol"]))]
+    else:
+        commission, commission_asset = float(order["cummulativeQuoteQty"]) * 0.001, quote_currency_of(order["symbol"])
+
+    return {
+        "symbol": order["symbol"],
+        "id": order["orderId"],
+        "orderId": order["orderId"],
+        "orderListId": -1,
+        "price": order["price"],
+        "qty": order["executedQty"],
+        "quoteQty": order["cummulativeQuoteQty"],
+        "commission": "{:.8f}".format(commission),
+        "commissionAsset": commission_asset,
+        "time": order["updateTime"],
+        "isBuyer": is_buyer,
+        "isMaker": False,
+        "isBestMatch": True
+    }
+
+
+def generate_ticker_prices(coins: List[str], seed: int=0) -> List[Dict[str, str]]:
+    '''
+    generate a ticker/price payload with the price of every coin against its quote currency.
+    '''
+    random_generator = random.Random(seed)
+    return [
+        {"symbol": coin + quote_currency(index), "price": "{:.8f}".format(random_generator.uniform(0.01, 5000))}
+        for index, coin in enumerate(coins)
+    ]
+
+
+class OfflineBinance(Client):
+    '''
+    Stand-in for `Binance` that serves synthetic payloads from memory, following binance's
+    paging and invalid symbol semantics, and counts the requests made against it.
+    '''
+    def __init__(self, coin_count: int, orders_per_coin: int, seed: int=0, **kwargs):
+        super().__init__(**kwargs)
+        self.coins: List[str] = generate_coins(coin_count)
+        self.orders: Dict[str, List[Dict[str, Any]]] = {
+            coin + quote_currency(index): generate_all_orders(coin + quote_currency(index), orders_per_coin, seed)
+            for index, coin in enumerate(self.coins)
+        }
+        self.account_snapshot: Dict[str, Any] = generate_account_snapshot(self.coins, seed)
+        self.ticker_prices: List[Dict[str, str]] = generate_ticker_prices(self.coins, seed)
+        self.ticker_prices.append({"symbol": "BNBUSDT", "price": "{:.8f}".format(BNB_PRICE)})
+        self.request_count: int = 0
+        self._request_count_lock = threading.Lock()
+        self.stream_url: str = "ws://127.0.0.1:0"
+
+
+    def _count_request(self) -> None:
+        # requests are made from the worker threads of `map_concurrently`
+        with self._request_count_lock:
+            self.request_count += 1
+
+
+    def _raise_invalid_symbol(self) -> None:
+        raise ClientException({"code": INVALID_SYMBOL_ERROR_CODE, "msg": "Invalid symbol."})
+
+
+    def get_all_orders(
+        self,
+        symbol: str,
+        order_id: Optional[int]=None,
+        start_time: Optional[int]=None,
+        limit: Optional[int]=None
+    ) -> List[Dict[str, Any]]:
+        self._count_request()
+        if symbol not in self.orders:
+            self._raise_invalid_symbol()
+
+        orders = [
+            order for order in self.orders[symbol]
+            if (order_id is None or order["orderId"] >= order_id) and (start_time is None or order["time"] >= start_time)
+        ]
+        # copies, since the portfolio formats the orders it receives in place
+        return [dict(order) for order in orders[:limit or 500]]
+
+
+    def get_my_trades(
+        self,
+        symbol: str,
+        from_id: Optional[int]=None,
+        start_time: Optional[int]=None,
+        limit: Optional[int]=None
+    ) -> List[Dict[str, Any]]:
+        self._count_request()
+        if symbol not in self.orders:
+            self._raise_invalid_symbol()
+
+        fills = [
+            generate_fill(order) for order in self.orders[symbol]
+            if order["status"] == "FILLED" and (from_id is None or order["orderId"] >= from_id)
+            and (start_time is None or order["updateTime"] >= start_time)
+        ]
+        return fills[:limit or 500]
+
+
+    def get_spot_account_snapshot(self) -> Dict[str, Any]:
+        self._count_request()
+        return self.account_snapshot
+
+
+    def get_ticker_price(self, ticker: str) -> Dict[str, str]:
+        self._count_request()
+        for ticker_price in self.ticker_prices:
+            if ticker_price["symbol"] == ticker:
+                return ticker_price
+        self._raise_invalid_symbol()
+
+
+    def get_ticker_prices(self, symbols: Optional[List[str]]=None) -> List[Dict[str, str]]:
+        self._count_request()
+        return [ticker_price for ticker_price in self.ticker_prices if symbols is None or ticker_price["symbol"] in symbols]
+
+
+    def get_exchange_info(self) -> Dict[str, Any]:
+        self._count_request()
+        return {
+            "timezone": "UTC",
+            "serverTime": timestamp(),
+            "symbols": [
+                {"symbol": coin + quote_currency(index), "status": "TRADING", "baseAsset": coin, "quoteAsset": quote_currency(index)}
+                for index, coin in enumerate(self.coins)
+            ]
+        }
+
+
+    def get_klines(
+        self,
+        symbol: str,
+        interval: str,
+        start_time: Optional[int]=None,
+        end_time: Optional[int]=None,
+        limit: Optional[int]=None
+    ) -> List[List[Any]]:
+        self._count_request()
+        if symbol not in self.orders:
+            self._raise_invalid_symbol()
+
+        interval_milliseconds = KLINE_INTERVALS[interval]
+        # every synthetic symbol is listed at BASE_TIME
+        open_time = max(-(-(start_time or 0) // interval_milliseconds) * interval_milliseconds, BASE_TIME)
+        end_time = end_time if end_time is not None else timestamp()
+        klines: List[List[Any]] = []
+        while open_time <= end_time and len(klines) < (limit or 500):
+            klines.append(generate_kline(symbol, open_time, interval_milliseconds))
+            open_time += interval_milliseconds
+        return klines
+
+
+    def create_listen_key(self) -> str:
+        self._count_request()
+        return "offlineListenKey"
+
+
+    def keep_alive_listen_key(self, listen_key: str) -> None:
+        self._count_request()
@@ -0,0 +1,79 @@
+from businessLogic.accounts import Account, AccountRunner, load_accounts
+from businessUtils.errorUtils import RuntimeException
+from businessUtils.fileIOUtils import read_from_json
+from test.benchmark.fixtures import OfflineBinance
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+
+class TestAccountRunner(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.output_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.output_dir.name)
+        os.mkdir("logs")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.output_dir.cleanup()
+
+    def test_load_accounts_from_environment(self):
+        environment = {
+            "ACCOUNTS": "main, sub", "MAIN_API_KEY": "a", "MAIN_SECRET_KEY": "b", "MAIN_PORTFOLIO_COST_OFFSET": "12.5",
+            "SUB_API_KEY": "c", "SUB_SECRET_KEY": "d"
+        }
+        with mock.patch.dict(os.environ, environment):
+            self.assertEqual(
+                [(account.name, account.api_key, account.secret_key, account.portfolio_cost_offset) for account in load_accounts()],
+                [("main", "a", "b", 12.5), ("sub", "c", "d", 0.0)]
+            )
+
+        with mock.patch.dict(os.environ, {"ACCOUNTS": "main"}):
+            self.assertRaises(RuntimeException, load_accounts)
+
+    def test_run_updates_accounts_with_a_shared_weight_limiter(self):
+        clients = {}
+
+        def client_factory(account, weight_limiter):
+            clients[account.name] = OfflineBinance(coin_count=4, orders_per_coin=10, seed=len(clients), weight_limiter=weight_limiter)
+            if account.name == "sub":
+                # a sub-account holding no USDT
+                balances = clients[account.name].account_snapshot["snapshotVos"][0]["data"]["balances"]
+                balances[:] = [balance for balance in balances if balance["asset"] != "USDT"]
+            return clients[account.name]
+
+        accounts = [Account("main", "a", "b", portfolio_cost_offset=100.0), Account("sub", "c", "d"), Account("broken", "e", "f")]
+        runner = AccountRunner(accounts, client_factory=client_factory)
+        with mock.patch.object(runner, "_update_account", side_effect=self._failing_for("broken", runner._update_account)):
+            account_summaries = runner.run()
+
+        self.assertEqual(sorted(account_summaries), ["main", "sub"])
+        self.assertIs(clients["main"].weight_limiter, clients["sub"].weight_limiter)
+        self.assertTrue(os.path.exists(os.path.join("accounts", "main", "spot_portfolio_summary.json")))
+        self.assertTrue(os.path.exists(os.path.join("accounts", "sub", "spot_portfolio_summary.json")))
+
+        for name, portfolio_cost_offset in (("main", 100.0), ("sub", 0.0)):
+            self.assertAlmostEqual(account_summaries[name][-1]["portfolioCost"], sum(
+                summary["totalCost"] for summary in account_summaries[name][:-1]
+            ) - portfolio_cost_offset)
+
+        consolidated_summary = read_from_json(os.path.join("accounts", "consolidated_portfolio_summary"))
+        coin_summary = next(summary for summary in consolidated_summary if summary.get("symbol") == "C0000")
+        self.assertEqual(coin_summary["accounts"], ["main", "sub"])
+        self.assertAlmostEqual(coin_summary["totalCost"], sum(
+            summary["totalCost"] for summaries in account_summaries.values() for summary in summaries if summary.get("symbol") == "C0000"
+        ))
+        self.assertAlmostEqual(consolidated_summary[-1]["portfolioValue"], sum(
+            summaries[-1]["portfolioValue"] for summaries in account_summaries.values()
+        ))
+
+    @staticmethod
+    def _failing_for(account_name, update_account):
+        def func(account):
+            if account.name == account_name:
+                raise RuntimeException("Invalid API-key.")
+            return update_account(account)
+        return func
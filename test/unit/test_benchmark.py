@@ -0,0 +1,20 @@
+from test.benchmark import bench_startup
+from test.benchmark.bench_portfolio import STAGES, run_benchmark
+
+import unittest
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_benchmark_reports_every_stage(self):
+        results = run_benchmark(coin_count=3, orders_per_coin=20, trace_memory=False)
+
+        for run in ("initial", "incremental"):
+            self.assertEqual(set(results[run]), {"requests", *STAGES})
+            for stage in STAGES:
+                self.assertGreater(results[run][stage]["seconds"], 0)
+
+    def test_driver_startup_skips_heavy_modules(self):
+        results = bench_startup.run_benchmark(runs=1)
+
+        self.assertEqual(results["heavyModulesImported"], [])
+        self.assertGreater(results["importSeconds"], 0)
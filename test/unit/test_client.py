@@ -0,0 +1,148 @@
+from businessApi.client import Client, RequestWeightLimiter, ResponseCache
+from businessUtils.apiUtils import RequestSigner, ServerClock, decode_json, timestamp
+from businessUtils.errorUtils import ClientException
+
+from requests.models import Response
+import hashlib
+import hmac
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+
+def _response(status_code: int, content: bytes, headers={}) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers.update(headers)
+    return response
+
+
+class _StubSession(object):
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent_params = []
+
+    def request(self, method, url_endpoint, *args, params=None, **kwargs):
+        self.sent_params.append(params)
+        return self.responses.pop(0)
+
+
+class TestClient(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.output_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.output_dir.name)
+        os.mkdir("logs")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.output_dir.cleanup()
+
+    def test_weight_limiter_tracks_reported_weight(self):
+        weight_limiter = RequestWeightLimiter(weight_limit=100, headroom=1.0)
+
+        weight_limiter.acquire(20)
+        weight_limiter.update(50)
+        weight_limiter.update(30)
+
+        self.assertEqual(weight_limiter.used_weight, 50)
+
+    def test_map_concurrently_keeps_order(self):
+        client = Client(max_workers=4)
+
+        results = client.map_concurrently(lambda item: item * 2, range(10))
+
+        self.assertEqual(results, [item * 2 for item in range(10)])
+
+    def test_send_get_request_retries_throttled_requests(self):
+        client = Client(backoff_factor=0)
+        client._resolve_params = lambda params: {**params, "attempt": len(client.session.sent_params)}
+        client.session = _StubSession([
+            _response(429, b'{"code": -1003}', {"Retry-After": "0"}),
+            _response(503, b'{}'),
+            _response(200, b'[1, 2]')
+        ])
+
+        payload = client.send_get_request("https://api.test/api/v3/allOrders", params={"symbol": "ETHUSDT"}, signed=True)
+
+        self.assertEqual(payload, [1, 2])
+        self.assertEqual([params["attempt"] for params in client.session.sent_params], [0, 1, 2])
+
+    def test_send_get_request_keeps_non_json_error_bodies(self):
+        client = Client(max_retries=0)
+        client.session = _StubSession([_response(400, b'<html>Bad Request</html>')])
+
+        with self.assertRaises(ClientException) as context:
+            client.send_get_request("https://api.test/api/v3/ticker/price")
+
+        self.assertEqual(context.exception.args[0], "<html>Bad Request</html>")
+
+    def test_send_get_request_resyncs_clock_on_timestamp_errors(self):
+        client = Client(backoff_factor=0)
+        client._resync_clock = lambda: client.session.sent_params.append("resync") or True
+        client._resolve_params = lambda params: {**params, "attempt": len(client.session.sent_params)}
+        client.session = _StubSession([
+            _response(400, b'{"code": -1021, "msg": "Timestamp for this request is outside of the recvWindow."}'),
+            _response(200, b'[1, 2]')
+        ])
+
+        payload = client.send_get_request("https://api.test/api/v3/allOrders", params={"symbol": "ETHUSDT"}, signed=True)
+
+        self.assertEqual(payload, [1, 2])
+        self.assertEqual(client.session.sent_params, [{"symbol": "ETHUSDT", "attempt": 0}, "resync", {"symbol": "ETHUSDT", "attempt": 2}])
+
+    def test_signed_error_bodies_are_decoded_once(self):
+        client = Client(backoff_factor=0)
+        client._resolve_params = lambda params: params
+        client.session = _StubSession([_response(400, b'{"code": -2013, "msg": "Order does not exist."}')])
+
+        with mock.patch("businessApi.client.decode_json", wraps=decode_json) as decoded_bodies:
+            with self.assertRaises(ClientException) as context:
+                client.send_get_request("https://api.test/api/v3/order", params={"symbol": "ETHUSDT"}, signed=True)
+
+        self.assertEqual(context.exception.args[0], {"code": -2013, "msg": "Order does not exist."})
+        self.assertEqual(decoded_bodies.call_count, 1)
+
+    def test_request_signer_signs_the_encoded_query_string(self):
+        query_string = RequestSigner("secret").sign_params({"symbol": "ETHUSDT", "newClientOrderId": "a b&c", "timestamp": 1})
+
+        signed_string, signature = query_string.split("&signature=")
+        self.assertEqual(signed_string, "symbol=ETHUSDT&newClientOrderId=a+b%26c&timestamp=1")
+        self.assertEqual(signature, hmac.new(b"secret", signed_string.encode(), hashlib.sha256).hexdigest().upper())
+
+    def test_server_clock_applies_server_offset(self):
+        clock = ServerClock(lambda: timestamp() + 5000, refresh_interval=60)
+        self.addCleanup(clock.stop)
+
+        self.assertAlmostEqual(clock.timestamp() - timestamp(), 5000, delta=50)
+
+    def test_send_get_request_answers_fresh_public_requests_from_cache(self):
+        client = Client()
+        client.cache_ttls = {"/api/v3/ticker/price": 60.0}
+        client.session = _StubSession([
+            _response(200, b'[{"symbol": "ETHUSDT", "price": "1.0"}]'),
+            _response(200, b'[{"symbol": "BTCUSDT", "price": "2.0"}]')
+        ])
+
+        first_payload = client.send_get_request("https://api.test/api/v3/ticker/price", params={"symbols": '["ETHUSDT"]'})
+        first_payload[0]["price"] = "3.0"
+        cached_payload = client.send_get_request("https://api.test/api/v3/ticker/price", params={"symbols": '["ETHUSDT"]'})
+        client.send_get_request("https://api.test/api/v3/ticker/price", params={"symbols": '["BTCUSDT"]'})
+
+        self.assertEqual(cached_payload, [{"symbol": "ETHUSDT", "price": "1.0"}])
+        self.assertEqual(len(client.session.sent_params), 2)
+        self.assertEqual((client.response_cache.hits, client.response_cache.misses), (1, 2))
+
+    def test_response_cache_evicts_least_recently_used_and_persists(self):
+        response_cache = ResponseCache(max_entries=2, store_filename="response_cache")
+        response_cache.set("a", [1], 60.0)
+        response_cache.set("b", [2], 60.0)
+        response_cache.get("a")
+        response_cache.set("c", [3], 60.0)
+        self.assertEqual(list(response_cache._entries), ["a", "c"])
+
+        response_cache.set("expired", [4], 0.0)
+        self.assertIsNone(response_cache.get("expired"))
+        self.assertEqual(ResponseCache(store_filename="response_cache").get("b"), [2])
@@ -0,0 +1,160 @@
+from businessUtils import fileIOUtils
+
+import importlib.util
+import openpyxl
+import os
+import tempfile
+import unittest
+
+
+def _order(symbol: str, order_id: int, order_time: int, status: str="FILLED"):
+    return {"symbol": symbol, "orderId": order_id, "time": order_time, "updateTime": order_time, "status": status}
+
+
+class TestFileIOUtils(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.output_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.output_dir.name)
+        os.mkdir("logs")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.output_dir.cleanup()
+
+    def test_upsert_orders_replaces_orders_by_symbol_and_order_id(self):
+        order_store = fileIOUtils.open_order_store("orders")
+        self.assertEqual(fileIOUtils.upsert_orders(order_store, [_order("ETHUSDT", 1, 200, "NEW"), _order("BTCUSDT", 1, 100)]), 2)
+        self.assertEqual(fileIOUtils.upsert_orders(order_store, [_order("ETHUSDT", 1, 200), _order("ETHUSDT", 2, 300), _order("BTCUSDT", 1, 100)]), 2)
+
+        self.assertEqual(fileIOUtils.count_orders(order_store), 3)
+        self.assertEqual(
+            [(order["symbol"], order["orderId"], order["status"]) for order in fileIOUtils.read_orders(order_store)],
+            [("BTCUSDT", 1, "FILLED"), ("ETHUSDT", 1, "FILLED"), ("ETHUSDT", 2, "FILLED")]
+        )
+
+    def test_write_to_json_skips_unchanged_data(self):
+        fileIOUtils.write_to_json([{"symbol": "ETH"}], "spot_balance")
+        os.utime("spot_balance.json", (0, 0))
+
+        fileIOUtils.write_to_json([{"symbol": "ETH"}], "spot_balance")
+        self.assertEqual(os.path.getmtime("spot_balance.json"), 0)
+
+        fileIOUtils.write_to_json([{"symbol": "BTC"}], "spot_balance")
+        self.assertEqual(fileIOUtils.read_from_json("spot_balance"), [{"symbol": "BTC"}])
+
+    def test_write_to_excel_streams_records(self):
+        fileIOUtils.write_to_excel([{"symbol": "ETH", "price": 1.5}, {"symbol": "BTC", "locked": "0"}], "spot_balance")
+
+        worksheet = openpyxl.load_workbook("spot_balance.xlsx").active
+        self.assertEqual(
+            list(worksheet.values),
+            [(None, "symbol", "price", "locked"), (0, "ETH", 1.5, None), (1, "BTC", None, "0")]
+        )
+
+    def test_queue_export_writes_a_snapshot_in_queued_order(self):
+        spot_balance = [{"symbol": "ETH", "balanceQty": "1.00000000"}]
+        fileIOUtils.queue_export(spot_balance, "spot_balance")
+        spot_balance[0]["balanceQty"] = "2.00000000"
+        fileIOUtils.queue_export([{"cursor": 1}], "order_cursors", excel=False, after=("spot_balance",))
+        fileIOUtils.export_queue.flush()
+
+        self.assertEqual(fileIOUtils.read_from_json("spot_balance"), [{"symbol": "ETH", "balanceQty": "1.00000000"}])
+        self.assertLessEqual(os.path.getmtime("spot_balance.xlsx"), os.path.getmtime("order_cursors.json"))
+        self.assertFalse(os.path.exists("order_cursors.xlsx"))
+        self.assertEqual([name for name in os.listdir() if ".tmp" in name], [])
+
+    def test_failed_export_keeps_the_previous_file(self):
+        fileIOUtils.write_to_json([{"symbol": "ETH"}], "spot_balance")
+        with self.assertRaises(ValueError):
+            with fileIOUtils._atomic_path("spot_balance.json") as temporary_filename:
+                with open(temporary_filename, "w") as file:
+                    file.write('[{"symbol": "BT')
+                raise ValueError("interrupted")
+
+        self.assertEqual(fileIOUtils.read_from_json("spot_balance"), [{"symbol": "ETH"}])
+        self.assertEqual(sorted(os.listdir()), [".export_fingerprints.json", "logs", "spot_balance.json"])
+
+        os.mkdir("spot_balance.xlsx")
+        fileIOUtils.queue_export([{"symbol": "BTC"}], "spot_balance")
+        with self.assertRaises(OSError):
+            fileIOUtils.export_queue.flush()
+
+    def test_flush_only_waits_for_the_exports_of_its_owner(self):
+        os.mkdir("account_b.xlsx")
+        fileIOUtils.queue_export([{"symbol": "ETH"}], "account_a", owner="a")
+        fileIOUtils.queue_export([{"symbol": "BTC"}], "account_b", owner="b")
+
+        fileIOUtils.export_queue.flush(owner="a")
+        self.assertTrue(os.path.exists("account_a.xlsx"))
+        with self.assertRaises(OSError):
+            fileIOUtils.export_queue.flush(owner="b")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "parquet exports need pyarrow")
+    def test_parquet_export_replaces_changed_date_partitions(self):
+        day = 86_400_000
+        fileIOUtils.queue_parquet_export(
+            [_order("ETHUSDT", 1, day, "NEW"), _order("ETHUSDT", 2, 2 * day)], "orders", fileIOUtils.ORDER_PARQUET_COLUMNS, partition_time_field="time"
+        )
+        fileIOUtils.queue_parquet_export(
+            [_order("ETHUSDT", 1, day), _order("ETHUSDT", 3, day + 1)], "orders", fileIOUtils.ORDER_PARQUET_COLUMNS, partition_time_field="time"
+        )
+
+        orders = fileIOUtils.read_parquet("orders", columns=["orderId", "status"], filters=[("status", "==", "FILLED")])
+        self.assertEqual(orders.column_names, ["orderId", "status"])
+        self.assertEqual(sorted(orders.column("orderId").to_pylist()), [1, 2, 3])
+        self.assertEqual(sorted(os.listdir("orders.parquet")), ["date=1970-01-02", "date=1970-01-03"])
+
+    def test_ticker_aggregates_mark_orders_aggregated(self):
+        order_store = fileIOUtils.open_order_store("orders")
+        fileIOUtils.upsert_orders(order_store, [_order("ETHUSDT", 1, 100), _order("ETHUSDT", 2, 200, "NEW")])
+
+        aggregated_orders = fileIOUtils.read_unaggregated_orders(order_store)
+        ticker_aggregates = {"ETHUSDT": dict.fromkeys(fileIOUtils.TICKER_AGGREGATE_FIELDS, 1.0)}
+        fileIOUtils.write_ticker_aggregates(order_store, ticker_aggregates, [(order["symbol"], order["orderId"]) for order in aggregated_orders])
+        fileIOUtils.upsert_orders(order_store, [_order("ETHUSDT", 1, 100), _order("ETHUSDT", 2, 200)])
+
+        self.assertEqual([order["orderId"] for order in aggregated_orders], [1])
+        self.assertEqual([order["orderId"] for order in fileIOUtils.read_unaggregated_orders(order_store)], [2])
+        self.assertEqual(fileIOUtils.read_ticker_aggregates(order_store), ticker_aggregates)
+
+    def test_read_unaggregated_order_frame_extracts_trade_columns(self):
+        trade_fields = {"side": "BUY", "origQty": "2.00000000", "executedQty": "1.50000000", "cummulativeQuoteQty": "300.00000000"}
+        order_store = fileIOUtils.open_order_store("orders")
+        fileIOUtils.upsert_orders(order_store, [
+            dict(_order("ETHUSDT", 2, 200), **trade_fields), dict(_order("BTCUSDT", 1, 100), **dict(trade_fields, side="SELL")),
+            dict(_order("ETHUSDT", 3, 300, "NEW"), **trade_fields)
+        ])
+
+        frame = fileIOUtils.read_unaggregated_order_frame(order_store)
+
+        self.assertEqual(frame.to_dict("records"), [
+            {"symbol": "BTCUSDT", "orderId": 1, "side": "SELL", "origQty": 2.0, "executedQty": 1.5, "cummulativeQuoteQty": 300.0},
+            {"symbol": "ETHUSDT", "orderId": 2, "side": "BUY", "origQty": 2.0, "executedQty": 1.5, "cummulativeQuoteQty": 300.0}
+        ])
+
+    def test_insert_fills_skips_stored_fills(self):
+        fill = {
+            "symbol": "ETHUSDT", "id": 1, "orderId": 1, "time": 100, "isBuyer": True, "price": "100.00000000",
+            "qty": "2.00000000", "quoteQty": "200.00000000", "commission": "0.00200000", "commissionAsset": "ETH"
+        }
+        order_store = fileIOUtils.open_order_store("orders")
+        self.assertEqual(fileIOUtils.insert_fills(order_store, [fill]), 1)
+        self.assertEqual(fileIOUtils.insert_fills(order_store, [fill, dict(fill, id=2, time=200)]), 1)
+
+        fills = fileIOUtils.read_fills(order_store)
+        self.assertEqual(fills["id"].tolist(), [1, 2])
+        self.assertEqual(fills["commission"].tolist(), [0.002, 0.002])
+
+    def test_kline_cache_replaces_candles_by_open_time(self):
+        kline_cache = fileIOUtils.open_kline_cache("klines")
+        self.assertIsNone(fileIOUtils.read_cached_kline_range(kline_cache, "ETHUSDT", "1d"))
+
+        fileIOUtils.upsert_klines(kline_cache, "ETHUSDT", "1d", [[100, "1", "1", "1", "1.5"], [200, "1", "1", "1", "2.5"]])
+        fileIOUtils.upsert_klines(kline_cache, "ETHUSDT", "1d", [[200, "1", "1", "1", "3.5"], [300, "1", "1", "1", "4.5"]])
+
+        self.assertEqual(fileIOUtils.read_cached_kline_range(kline_cache, "ETHUSDT", "1d"), (100, 300))
+        self.assertEqual(
+            fileIOUtils.read_kline_closes(kline_cache, "1d", ["ETHUSDT"], start_time=200).values.tolist(),
+            [["ETHUSDT", 200, 3.5], ["ETHUSDT", 300, 4.5]]
+        )
@@ -0,0 +1,22 @@
+from businessUtils import logUtils
+from businessUtils.logUtils import LogLevel
+
+import unittest
+
+
+class TestLogUtils(unittest.TestCase):
+    def tearDown(self):
+        logUtils.set_log_level(LogLevel.INFO)
+
+    def test_log_level_filtering(self):
+        logUtils.set_log_level(LogLevel.INFO)
+
+        self.assertFalse(logUtils.is_log_enabled(LogLevel.TRACE))
+        self.assertTrue(logUtils.is_log_enabled(LogLevel.INFO))
+        self.assertTrue(logUtils.is_log_enabled(LogLevel.ERROR))
+
+    def test_truncate_large_payloads(self):
+        message = logUtils._truncate("x" * (logUtils.MAX_LOG_ARG_LENGTH + 10))
+
+        self.assertTrue(message.startswith("x" * logUtils.MAX_LOG_ARG_LENGTH + "..."))
+        self.assertTrue(message.endswith("(10 more characters)"))
@@ -0,0 +1,32 @@
+from businessUtils import metricsUtils
+from businessUtils.metricsUtils import Metrics
+
+import unittest
+
+
+class TestMetricsUtils(unittest.TestCase):
+    def test_counters_gauges_and_timers(self):
+        metrics = Metrics()
+        metrics.increment("http.requests")
+        metrics.increment("http.bytes", 512)
+        metrics.set_gauge("http.used_weight", 40)
+        with metrics.timer("http.get /api/v3/allOrders"):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.timer("http.get /api/v3/allOrders"):
+                raise ValueError()
+
+        report = metrics.report()
+        self.assertEqual(report["counters"], {"http.requests": 1, "http.bytes": 512})
+        self.assertEqual(report["gauges"], {"http.used_weight": 40})
+        self.assertEqual(report["timers"]["http.get /api/v3/allOrders"]["count"], 2)
+
+    def test_format_prometheus_report(self):
+        metrics = Metrics()
+        metrics.increment("http.requests", 3)
+        metrics.observe("portfolio.update", 1.5)
+
+        prometheus_report = metricsUtils.format_prometheus_report(metrics.report())
+
+        self.assertIn("portfolio_http_requests_total 3", prometheus_report)
+        self.assertIn('portfolio_timer_seconds_total{name="portfolio.update"} 1.5', prometheus_report)
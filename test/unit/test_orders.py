@@ -0,0 +1,38 @@
+from businessLogic.orders import SpotOrder
+from businessUtils import portfolioUtils
+from businessUtils.fileIOUtils import _encode_json
+from test.benchmark.fixtures import generate_all_orders
+
+import copy
+import json
+import unittest
+
+
+class TestSpotOrder(unittest.TestCase):
+    def test_to_dict_round_trips_binance_orders(self):
+        orders = generate_all_orders("ETHUSDT", 200)
+        orders[0]["workingTime"] = orders[0]["time"]
+        orders[0]["selfTradePreventionMode"] = "EXPIRE_MAKER"
+        orders[1]["executedQty"] = "123456789.123456789"
+        del orders[2]["isWorking"]
+        orders[3]["preventedMatchId"] = 1
+
+        spot_orders = [SpotOrder.from_dict(order) for order in orders]
+
+        self.assertEqual([spot_order.to_dict() for spot_order in spot_orders], orders)
+        self.assertEqual(json.loads(_encode_json(spot_orders)), orders)
+        self.assertIsInstance(spot_orders[0]["executedQty"], float)
+        self.assertNotIn("isWorking", spot_orders[2])
+        # fields of current allOrders responses are held in slots, only unknown ones in a dict
+        self.assertIsNone(spot_orders[0]._extra_fields)
+        self.assertEqual(spot_orders[3]._extra_fields, {"preventedMatchId": 1})
+
+    def test_resolve_spot_trade_matches_dict_order(self):
+        order = generate_all_orders("ETHUSDT", 1)[0]
+        spot_order = SpotOrder.from_dict(order)
+
+        resolved_order = portfolioUtils.resolve_spot_trade(copy.deepcopy(order))
+        portfolioUtils.resolve_spot_trade(spot_order)
+
+        self.assertEqual(spot_order.to_dict(), resolved_order)
+        self.assertEqual(list(spot_order)[-4:], ["actualQty", "fee", "actualCost", "totalCost"])
@@ -0,0 +1,133 @@
+from businessLogic.portfolio import Portfolio
+from businessUtils.fileIOUtils import read_from_json, read_parquet, write_to_json
+from businessUtils.switchUtils import Switch
+from test.benchmark.fixtures import OfflineBinance
+
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+
+class TestPortfolio(unittest.TestCase):
+    def _start_in_empty_output_dir(self):
+        output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(output_dir.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(output_dir.name)
+        os.mkdir("logs")
+
+        self.binance = OfflineBinance(coin_count=2, orders_per_coin=10)
+        write_to_json(self.binance.coins, "spot_tickers")
+        write_to_json([], "spot_order_history")
+
+    def _update_with_open_order_filled_later(self):
+        '''
+        update the portfolio while the first order of a symbol is still NEW, then again once it FILLED
+        '''
+        symbol, orders = next(iter(self.binance.orders.items()))
+        open_order = orders[0]
+        filled_order = dict(open_order, status="FILLED", side="BUY", executedQty=open_order["origQty"])
+        orders[0] = dict(open_order, status="NEW", executedQty="0.00000000", cummulativeQuoteQty="0.00000000")
+        Portfolio(binance=self.binance).update()
+
+        orders[0] = dict(filled_order, updateTime=filled_order["updateTime"] + 1)
+        portfolio = Portfolio(binance=self.binance)
+        portfolio.update()
+
+        return symbol, filled_order, portfolio
+
+    def test_open_orders_are_updated_once_filled(self):
+        for switches in (
+            {"export_spot_order_history": True},
+            {"use_order_store": False},
+            {"use_incremental_portfolio_summary": False, "export_spot_order_history": True}
+        ):
+            with self.subTest(switches=switches), mock.patch.dict(Switch.switches, switches):
+                self._start_in_empty_output_dir()
+                symbol, filled_order, portfolio = self._update_with_open_order_filled_later()
+
+                spot_order_history = read_from_json("spot_order_history")
+                self.assertEqual(
+                    [order["status"] for order in spot_order_history if (order["symbol"], order["orderId"]) == (symbol, filled_order["orderId"])],
+                    ["FILLED"]
+                )
+                self.assertEqual(len(spot_order_history), sum(len(orders) for orders in self.binance.orders.values()))
+                self.assertIn(filled_order["orderId"], [trade["orderId"] for trade in read_from_json("spot_trades")[symbol]])
+                self.assertEqual(portfolio.order_cursors[symbol]["orderId"], self.binance.orders[symbol][-1]["orderId"])
+
+    def test_incremental_summary_only_refines_new_trades(self):
+        ticker_aggregates = {}
+        for use_vectorized_trade_engine in (True, False):
+            switches = {"export_spot_order_history": False, "use_vectorized_trade_engine": use_vectorized_trade_engine}
+            with self.subTest(switches=switches), mock.patch.dict(Switch.switches, switches):
+                self._start_in_empty_output_dir()
+                symbol, filled_order, portfolio = self._update_with_open_order_filled_later()
+
+                self.assertFalse(os.path.exists("spot_trades.json"))
+                self.assertEqual(portfolio.spot_trades, {})
+                self.assertAlmostEqual(portfolio.ticker_aggregates[symbol]["totalCost"], sum(
+                    float(order["cummulativeQuoteQty"]) for order in self.binance.orders[symbol]
+                    if order["status"] == "FILLED" and order["side"] == "BUY"
+                ))
+                ticker_aggregates[use_vectorized_trade_engine] = portfolio.ticker_aggregates
+
+        self.assertEqual(ticker_aggregates[True], ticker_aggregates[False])
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "parquet exports need pyarrow")
+    def test_parquet_exports_follow_the_order_history(self):
+        for switches in ({"export_parquet": True}, {"export_parquet": True, "use_order_store": False}):
+            with self.subTest(switches=switches), mock.patch.dict(Switch.switches, switches):
+                self._start_in_empty_output_dir()
+                symbol, filled_order, portfolio = self._update_with_open_order_filled_later()
+
+                orders = read_parquet("spot_order_history").to_pylist()
+                self.assertEqual(len(orders), sum(len(orders) for orders in self.binance.orders.values()))
+                self.assertEqual(
+                    [order["status"] for order in orders if (order["symbol"], order["orderId"]) == (symbol, filled_order["orderId"])],
+                    ["FILLED"]
+                )
+                self.assertEqual(read_parquet("spot_portfolio_summary").num_rows, len(read_from_json("spot_portfolio_summary")))
+
+    def test_trade_fills_are_fetched_for_traded_symbols_only(self):
+        with mock.patch.dict(Switch.switches, {"use_trade_fills": True}):
+            self._start_in_empty_output_dir()
+            with mock.patch.object(self.binance, "get_my_trades", wraps=self.binance.get_my_trades) as get_my_trades:
+                symbol, filled_order, portfolio = self._update_with_open_order_filled_later()
+
+            self.assertEqual(
+                [call.args[0] for call in get_my_trades.call_args_list],
+                sorted(self.binance.orders) + [symbol]
+            )
+            fill_summary = next(summary for summary in portfolio.fill_summaries if symbol.startswith(summary["symbol"]))
+            self.assertGreater(fill_summary["fees"], 0)
+            self.assertIn("fees", read_from_json("spot_portfolio_summary")[0])
+
+    def test_trade_fills_summary_without_any_fills(self):
+        with mock.patch.dict(Switch.switches, {"use_trade_fills": True}):
+            self._start_in_empty_output_dir()
+            self.binance = OfflineBinance(coin_count=2, orders_per_coin=0)
+            Portfolio(binance=self.binance).update()
+
+            portfolio_summary = read_from_json("spot_portfolio_summary")
+            self.assertEqual(portfolio_summary[-1]["portfolioCost"], 0.0)
+            self.assertEqual(portfolio_summary[-1]["portfolioPNL%"], "{:.2f}".format(portfolio_summary[-1]["portfolioValue"] * 100) + "%")
+
+    def test_diff_spot_balance_reprices_changed_balances_only(self):
+        with mock.patch.dict(Switch.switches, {"diff_spot_balance": True}):
+            self._start_in_empty_output_dir()
+            Portfolio(binance=self.binance).update()
+
+            balances = self.binance.account_snapshot["snapshotVos"][-1]["data"]["balances"]
+            balances[0]["free"] = "1.00000000"
+            portfolio = Portfolio(binance=self.binance)
+            portfolio.material_balance_value = float("inf")
+            with mock.patch.object(portfolio, "_get_current_ticker_prices", wraps=portfolio._get_current_ticker_prices) as get_current_ticker_prices:
+                portfolio._write_spot_balance()
+                portfolio._write_spot_balance()
+            portfolio._flush_exports()
+
+            get_current_ticker_prices.assert_called_once_with({balances[0]["asset"]})
+            self.assertEqual(portfolio.spot_balance[balances[0]["asset"]]["balanceQty"], "1.00000000")
+            self.assertEqual(read_from_json("spot_balance"), list(portfolio.spot_balance.values()))
@@ -0,0 +1,119 @@
+from businessApi.stream import BinanceStream
+from businessLogic.daemon import PortfolioDaemon
+from businessLogic.portfolio import Portfolio
+from businessUtils.errorUtils import RuntimeException
+from businessUtils.fileIOUtils import read_from_json, write_to_json
+from businessUtils.switchUtils import Switch
+from test.benchmark.fixtures import OfflineBinance
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+import websockets
+from unittest import mock
+
+
+def _execution_report(symbol: str, order_id: int) -> dict:
+    return {
+        "e": "executionReport", "E": 1700000000100, "s": symbol, "c": "live", "S": "BUY", "o": "LIMIT", "f": "GTC",
+        "q": "2.00000000", "p": "10.00000000", "P": "0.00000000", "F": "0.00000000", "g": -1, "X": "FILLED",
+        "i": order_id, "z": "2.00000000", "Z": "20.00000000", "O": 1700000000000, "T": 1700000000100, "w": False,
+        "Q": "0.00000000"
+    }
+
+
+class TestPortfolioDaemon(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.output_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.output_dir.name)
+
+        self.binance = OfflineBinance(coin_count=3, orders_per_coin=20)
+        write_to_json(self.binance.coins, "spot_tickers")
+        write_to_json([], "spot_order_history")
+        self.portfolio = Portfolio(binance=self.binance)
+        self.portfolio.update()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.output_dir.cleanup()
+
+    def test_daemon_applies_stream_events(self):
+        coin = self.binance.coins[0]
+        symbol = self.portfolio.ticker_prices[coin]["symbol"]
+        stream_events = [
+            {"stream": f"{symbol.lower()}@miniTicker", "data": {"e": "24hrMiniTicker", "s": symbol, "c": "12.50000000"}},
+            {"stream": "offlineListenKey", "data": _execution_report(symbol, 1000)},
+            {"stream": "offlineListenKey", "data": {"e": "outboundAccountPosition", "B": [{"a": coin, "f": "4.00000000", "l": "0.00000000"}]}}
+        ]
+        requested_paths = []
+        apply_new_orders = self.portfolio.apply_new_orders
+        order_threads = []
+
+        def apply_new_orders_on_thread(orders):
+            order_threads.append(threading.current_thread())
+            apply_new_orders(orders)
+        self.portfolio.apply_new_orders = apply_new_orders_on_thread
+
+        async def stream_server(websocket, *args):
+            requested_paths.append(args[0] if args else websocket.request.path)
+            for stream_event in stream_events:
+                await websocket.send(json.dumps(stream_event))
+            await websocket.wait_closed()
+
+        async def run_daemon():
+            async with websockets.serve(stream_server, "127.0.0.1", 0) as server:
+                port = server.sockets[0].getsockname()[1]
+                daemon = PortfolioDaemon(self.portfolio, stream_url=f"ws://127.0.0.1:{port}", write_interval=0.01, refresh_on_start=False)
+                stop_event = asyncio.Event()
+                daemon_task = asyncio.ensure_future(daemon.run(stop_event))
+                for _ in range(500):
+                    if self.portfolio.spot_balance[coin]["balanceQty"] == "4.00000000":
+                        break
+                    await asyncio.sleep(0.01)
+                stop_event.set()
+                await daemon_task
+
+        asyncio.run(run_daemon())
+
+        self.assertIn("offlineListenKey", requested_paths[0])
+        self.assertEqual(len(order_threads), 1)
+        self.assertIsNot(order_threads[0], threading.main_thread())
+        self.assertEqual(self.portfolio.spot_balance[coin]["price"], 12.5)
+        self.assertEqual(self.portfolio.spot_balance[coin]["actualValue"], 50.0)
+        self.assertEqual(self.portfolio.ticker_aggregates[symbol]["totalCost"] - 20.0, sum(
+            float(order["cummulativeQuoteQty"]) for order in self.binance.orders[symbol]
+            if order["status"] == "FILLED" and order["side"] == "BUY"
+        ))
+        coin_summary = next(summary for summary in read_from_json("spot_portfolio_summary") if summary.get("symbol") == coin)
+        self.assertEqual(coin_summary["actualValue"], 50.0)
+
+    def test_stream_reconnects_after_failed_handshakes(self):
+        connection_errors = [asyncio.TimeoutError(), websockets.InvalidHandshake("rejected"), ValueError("stop")]
+        stream = BinanceStream("ws://127.0.0.1:1", ["ethusdt@miniTicker"], lambda stream, event: None, reconnect_delay=0)
+
+        with mock.patch("businessApi.stream.websockets.connect", side_effect=connection_errors) as connect:
+            with self.assertRaises(ValueError):
+                asyncio.run(stream.run())
+        self.assertEqual(connect.call_count, 3)
+
+    def test_daemon_fails_when_a_task_dies(self):
+        async def dying_stream(stream):
+            await asyncio.sleep(0.01)
+            raise ValueError("stream died")
+
+        daemon = PortfolioDaemon(self.portfolio, stream_url="ws://127.0.0.1:1", use_user_data_stream=False, refresh_on_start=False)
+        with mock.patch.object(BinanceStream, "run", dying_stream):
+            with self.assertRaises(ValueError):
+                asyncio.run(asyncio.wait_for(daemon.run(), timeout=5))
+        self.assertTrue(os.path.exists("spot_portfolio_summary.json"))
+
+    def test_daemon_checks_its_switches_before_connecting(self):
+        daemon = PortfolioDaemon(self.portfolio, stream_url="ws://127.0.0.1:1", refresh_on_start=False)
+        with mock.patch.dict(Switch.switches, {"use_incremental_portfolio_summary": False}):
+            with self.assertRaises(RuntimeException):
+                asyncio.run(daemon.run())
+        self.assertIsNone(daemon.listen_key)
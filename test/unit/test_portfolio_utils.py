@@ -1,8 +1,180 @@
 from businessUtils import portfolioUtils
+from businessUtils.errorUtils import RuntimeException
 
+import copy
+import pandas as pd
+import random
 import unittest
 
 
+def _spot_order_history(size: int):
+    random_generator = random.Random(7)
+    return [
+        {
+            "symbol": random_generator.choice(("ETHUSDT", "BTCUSDT", "XYZBUSD")),
+            "orderId": order_id,
+            "side": random_generator.choice(("BUY", "SELL")),
+            "status": random_generator.choice(("FILLED", "FILLED", "CANCELED")),
+            "origQty": "{:.8f}".format(random_generator.uniform(0, 10)),
+            "executedQty": "{:.8f}".format(random_generator.uniform(0, 10)),
+            "cummulativeQuoteQty": "{:.8f}".format(random_generator.uniform(0, 5000))
+        }
+        for order_id in range(size)
+    ]
+
+
 class TestPortfolioUtils(unittest.TestCase):
     def test_reduce_trade_history(self):
-        self.assertTrue(True)
+        trade_history = [
+            {"symbol": "ETHUSDT", "orderId": 1, "status": "FILLED"},
+            {"symbol": "ETHUSDT", "orderId": 2, "status": "NEW"}
+        ]
+
+        order_index = portfolioUtils.reduce_trade_history(trade_history, [
+            {"symbol": "ETHUSDT", "orderId": 2, "status": "FILLED"},
+            {"symbol": "BTCUSDT", "orderId": 1, "status": "FILLED"}
+        ])
+        portfolioUtils.reduce_trade_history(trade_history, [{"symbol": "BTCUSDT", "orderId": 1, "status": "FILLED"}], order_index)
+
+        self.assertEqual(
+            [(trade["symbol"], trade["orderId"], trade["status"]) for trade in trade_history],
+            [("ETHUSDT", 1, "FILLED"), ("ETHUSDT", 2, "FILLED"), ("BTCUSDT", 1, "FILLED")]
+        )
+
+    def test_update_order_cursor(self):
+        order_cursors = {"ETHUSDT": {"orderId": 3, "updateTime": 300}}
+        orders = [
+            {"orderId": 7, "updateTime": 700, "status": "FILLED"},
+            {"orderId": 5, "updateTime": 900, "status": "CANCELED"}
+        ]
+
+        portfolioUtils.update_order_cursor(order_cursors, "ETHUSDT", orders)
+        portfolioUtils.update_order_cursor(order_cursors, "BTCUSDT", [])
+
+        self.assertEqual(order_cursors, {"ETHUSDT": {"orderId": 7, "updateTime": 700}})
+
+    def test_update_order_cursor_holds_at_oldest_open_order(self):
+        order_cursors = {}
+        orders = [
+            {"orderId": 4, "updateTime": 400, "status": "PARTIALLY_FILLED"},
+            {"orderId": 6, "updateTime": 600, "status": "NEW"},
+            {"orderId": 7, "updateTime": 700, "status": "FILLED"}
+        ]
+
+        portfolioUtils.update_order_cursor(order_cursors, "ETHUSDT", orders)
+
+        self.assertEqual(order_cursors, {"ETHUSDT": {"orderId": 3, "updateTime": 700}})
+
+    def test_resolve_ticker_price_falls_back_to_next_quote(self):
+        ticker_prices = {
+            "ETHUSDT": {"symbol": "ETHUSDT", "price": "1800.0"},
+            "XYZBUSD": {"symbol": "XYZBUSD", "price": "3.0"}
+        }
+
+        self.assertEqual(portfolioUtils.resolve_ticker_price("ETH", ticker_prices, ("USDT", "BUSD"))["symbol"], "ETHUSDT")
+        self.assertEqual(portfolioUtils.resolve_ticker_price("XYZ", ticker_prices, ("USDT", "BUSD"))["symbol"], "XYZBUSD")
+        with self.assertRaises(RuntimeException):
+            portfolioUtils.resolve_ticker_price("ABC", ticker_prices, ("USDT", "BUSD"))
+
+    def test_resolve_ticker_price_through_conversion_pair(self):
+        ticker_prices = {
+            "BTCUSDT": {"symbol": "BTCUSDT", "price": "20000.0"},
+            "XYZBTC": {"symbol": "XYZBTC", "price": "0.0001"}
+        }
+
+        self.assertEqual(
+            portfolioUtils.resolve_ticker_price("XYZ", ticker_prices, ("USDT", "BUSD"), ("FDUSD", "BTC")),
+            {"symbol": "XYZBTC", "price": "2.0", "quoteSymbol": "BTCUSDT"}
+        )
+        with self.assertRaises(RuntimeException):
+            portfolioUtils.resolve_ticker_price("XYZ", ticker_prices, ("USDT", "BUSD"), ("ETH",))
+
+    def test_find_symbol_in_symbol_index(self):
+        symbol_index = portfolioUtils.create_symbol_index({"symbols": [
+            {"symbol": "ETHBTC", "status": "TRADING", "baseAsset": "ETH", "quoteAsset": "BTC"},
+            {"symbol": "XYZBUSD", "status": "BREAK", "baseAsset": "XYZ", "quoteAsset": "BUSD"},
+            {"symbol": "XYZUSDT", "status": "TRADING", "baseAsset": "XYZ", "quoteAsset": "USDT"}
+        ]})
+
+        self.assertEqual(portfolioUtils.find_symbol(symbol_index, "XYZ", ("USDT", "BUSD")), "XYZUSDT")
+        self.assertEqual(portfolioUtils.find_symbol(symbol_index, "XYZ", ("BUSD", "USDT")), "XYZBUSD")
+        self.assertIsNone(portfolioUtils.find_symbol(symbol_index, "ETH", ("USDT", "BUSD")))
+        self.assertIsNone(portfolioUtils.find_symbol(symbol_index, "ABC", ("USDT", "BUSD")))
+
+    def test_vectorized_trade_engine_matches_dict_path(self):
+        spot_order_history = _spot_order_history(2000)
+        spot_trades = [
+            portfolioUtils.resolve_spot_trade(spot_trade)
+            for spot_trade in copy.deepcopy(spot_order_history) if spot_trade["status"] == "FILLED"
+        ]
+
+        ticker_aggregates, vectorized_ticker_aggregates = {}, {}
+        for batch in (slice(None, 800), slice(800, None)):
+            portfolioUtils.fold_ticker_aggregates(ticker_aggregates, [
+                spot_trade for spot_trade in spot_trades if spot_trade["orderId"] in range(2000)[batch]
+            ])
+            portfolioUtils.fold_ticker_aggregate_frame(vectorized_ticker_aggregates, portfolioUtils.create_spot_trade_frame(spot_order_history[batch]))
+
+        self.assertEqual(vectorized_ticker_aggregates, ticker_aggregates)
+
+        with self.assertRaises(RuntimeException):
+            portfolioUtils.create_spot_trade_frame([dict(spot_order_history[0], status="FILLED", side="HOLD")])
+
+    def test_fold_ticker_aggregates_matches_ticker_summary(self):
+        spot_trades = [
+            portfolioUtils.resolve_spot_trade(spot_trade)
+            for spot_trade in _spot_order_history(500) if spot_trade["status"] == "FILLED" and spot_trade["symbol"] == "ETHUSDT"
+        ]
+
+        ticker_aggregates = {}
+        portfolioUtils.fold_ticker_aggregates(ticker_aggregates, spot_trades[:200])
+        portfolioUtils.fold_ticker_aggregates(ticker_aggregates, spot_trades[200:])
+        ticker_summary = portfolioUtils.create_ticker_summary_from_aggregate("ETH", ticker_aggregates["ETHUSDT"])
+        expected_ticker_summary = portfolioUtils.create_ticker_summary("ETH", spot_trades)
+
+        ticker_summary.pop("date")
+        expected_ticker_summary.pop("date")
+        self.assertEqual(ticker_summary, expected_ticker_summary)
+
+    def test_create_pnl_history_values_positions_at_candle_closes(self):
+        day = portfolioUtils.KLINE_INTERVALS["1d"]
+        filled_orders = [
+            {"symbol": "ETHUSDT", "side": "BUY", "status": "FILLED", "time": day + 5, "origQty": "2", "executedQty": "2", "cummulativeQuoteQty": "20"},
+            {"symbol": "ETHUSDT", "side": "SELL", "status": "FILLED", "time": 3 * day, "origQty": "1", "executedQty": "1", "cummulativeQuoteQty": "30"}
+        ]
+        kline_closes = pd.DataFrame({"symbol": ["ETHUSDT"] * 2, "openTime": [day, 3 * day], "close": [10.0, 30.0]})
+
+        pnl_history = portfolioUtils.create_pnl_history(filled_orders, kline_closes, day, 3 * day + 1)
+
+        eth_qty = 2 * (1 - portfolioUtils.FEE_RATE)
+        self.assertEqual(pnl_history.index.tolist(), [day, 2 * day, 3 * day])
+        self.assertEqual(pnl_history["ETHUSDT"].tolist(), [eth_qty * 10, eth_qty * 10, (eth_qty - 1) * 30])
+        self.assertEqual(pnl_history["netInvested"].tolist(), [20, 20, 20 - 30 * (1 - portfolioUtils.FEE_RATE)])
+        self.assertEqual(pnl_history["pnl"].tolist(), (pnl_history["totalValue"] - pnl_history["netInvested"]).tolist())
+
+    def test_create_fill_summaries_from_commissions_paid(self):
+        fills = pd.DataFrame([
+            ("ETHUSDT", 1, True, 100.0, 2.0, 200.0, 0.002, "ETH"),
+            ("ETHUSDT", 2, True, 110.0, 1.0, 110.0, 0.0001, "BNB"),
+            ("ETHUSDT", 3, False, 120.0, 1.0, 120.0, 0.12, "USDT"),
+            ("XYZBUSD", 1, True, 1.0, 10.0, 10.0, 0.01, "BUSD")
+        ], columns=["symbol", "id", "isBuyer", "price", "qty", "quoteQty", "commission", "commissionAsset"])
+
+        eth_summary, xyz_summary = portfolioUtils.create_fill_summaries(fills, ("USDT", "BUSD"), {"BNB": 500.0})
+
+        self.assertEqual(eth_summary["symbol"], "ETH")
+        self.assertAlmostEqual(eth_summary["origQty"], 3.0)
+        self.assertAlmostEqual(eth_summary["actualQty"], 2.998)
+        self.assertAlmostEqual(eth_summary["totalCost"], 310.05)
+        self.assertAlmostEqual(eth_summary["totalSaleQty"], 1.0)
+        self.assertAlmostEqual(eth_summary["totalSaleValue"], 119.88)
+        self.assertAlmostEqual(eth_summary["fees"], 0.37)
+        self.assertAlmostEqual(eth_summary["costBasis"], 310.05 / 2.998 * 1.998)
+        self.assertEqual(xyz_summary["symbol"], "XYZ")
+        self.assertAlmostEqual(xyz_summary["totalCost"], 10.01)
+        self.assertAlmostEqual(xyz_summary["actualQty"], 10.0)
+
+    def test_find_missing_kline_ranges(self):
+        self.assertEqual(portfolioUtils.find_missing_kline_ranges(None, 150, 900, 100), [(100, 900)])
+        self.assertEqual(portfolioUtils.find_missing_kline_ranges((300, 600), 150, 900, 100), [(100, 299), (600, 900)])
+        self.assertEqual(portfolioUtils.find_missing_kline_ranges((100, 600), 150, 900, 100), [(600, 900)])